@@ -1,21 +1,77 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for, flash
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, flash, stream_with_context
 from collections import defaultdict
+import csv
+import io
+import math
+import multiprocessing
 import random
-import copy
+import heapq
+from bisect import bisect_left
 import os
-from models import db, User, Timetable, Slot, Classroom, Faculty, Subject, Batch, Shift
+import json
+import time
+import uuid
+import threading
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from sqlalchemy import event, insert, update, or_, and_, func, case, distinct
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from metrics import Metrics, registry as metrics_registry
+from migrations import migrate
+from models import (db, User, Timetable, Slot, Classroom, Faculty, Subject, Batch, Shift, GenerationJob, GenerationCache,
+                    FacultySubject, FacultyUnavailability, SubjectBatch, SubjectFixedSlot, BatchElective, TableVersion,
+                    parse_slot_ref)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Flask app setup
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///timetable.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///timetable.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Processes used by /api/generate for construction attempts (1 = run in the request thread)
+app.config['GENERATION_WORKERS'] = int(os.environ.get('GENERATION_WORKERS', 1))
+# Background threads that run queued generation jobs
+app.config['GENERATION_JOB_THREADS'] = int(os.environ.get('GENERATION_JOB_THREADS', 2))
+# Generation result cache limits (0 entries disables the cache)
+app.config['GENERATION_CACHE_ENTRIES'] = int(os.environ.get('GENERATION_CACHE_ENTRIES', 200))
+app.config['GENERATION_CACHE_BYTES'] = int(os.environ.get('GENERATION_CACHE_BYTES', 50 * 1024 * 1024))
+# Rows per transaction of a bulk import and per fetch of a bulk export
+app.config['BULK_CHUNK_ROWS'] = int(os.environ.get('BULK_CHUNK_ROWS', 500))
+# DB_PROFILE=production tunes SQLite for concurrent requests: WAL journaling so readers never wait
+# for a writer, a busy timeout so writers queue instead of failing with "database is locked",
+# and a connection pool sized for the request and job threads
+app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'default')
+app.config['DB_BUSY_TIMEOUT_MS'] = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 15000))
+app.config['DB_MMAP_SIZE'] = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['DB_CACHE_SIZE_KB'] = int(os.environ.get('DB_CACHE_SIZE_KB', 64 * 1024))
+if app.config['DB_PROFILE'] == 'production':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'connect_args': {'timeout': app.config['DB_BUSY_TIMEOUT_MS'] / 1000, 'check_same_thread': False}
+    }
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')  # durable at checkpoints; safe against corruption in WAL mode
+    cursor.execute(f"PRAGMA busy_timeout={app.config['DB_BUSY_TIMEOUT_MS']}")
+    cursor.execute(f"PRAGMA mmap_size={app.config['DB_MMAP_SIZE']}")
+    cursor.execute(f"PRAGMA cache_size=-{app.config['DB_CACHE_SIZE_KB']}")  # negative means KiB
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
 
 # Initialize extensions
 db.init_app(app)
+if app.config['DB_PROFILE'] == 'production':
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _apply_sqlite_pragmas)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -25,6 +81,155 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 # --- Temporal Harmony Algorithm ---
+class Lecture:
+    """A lecture compiled to interned indexes: subject, teacher, batch, room, day and slot.
+    An unplaced lecture has room, day and slot set to -1."""
+    __slots__ = ('subject', 'teacher', 'batch', 'room', 'day', 'slot')
+
+    def __init__(self, subject, teacher, batch, room=-1, day=-1, slot=-1):
+        self.subject = subject
+        self.teacher = teacher
+        self.batch = batch
+        self.room = room
+        self.day = day
+        self.slot = slot
+
+    def placed(self, room, day, slot):
+        return Lecture(self.subject, self.teacher, self.batch, room, day, slot)
+
+class OccupancyIndex:
+    """Per-(day, slot) bitmasks of busy teachers, batches and rooms so clash checks cost O(1).
+    Meant for clash-free timetables: removing a double-booked entity frees it for both lectures."""
+    def __init__(self, num_days, slots_per_day, num_teachers, timetable=()):
+        self.num_days = num_days
+        self.slots_per_day = slots_per_day
+        self.teachers = [0] * (num_days * slots_per_day)
+        self.batches = [0] * (num_days * slots_per_day)
+        self.rooms = [0] * (num_days * slots_per_day)
+        self.teacher_day_load = [0] * (num_teachers * num_days)
+        self.batch_day_load = defaultdict(int)
+        for lecture in timetable:
+            self.place(lecture)
+
+    def place(self, lecture):
+        key = lecture.day * self.slots_per_day + lecture.slot
+        self.teachers[key] |= 1 << lecture.teacher
+        self.batches[key] |= 1 << lecture.batch
+        self.rooms[key] |= 1 << lecture.room
+        self.teacher_day_load[lecture.teacher * self.num_days + lecture.day] += 1
+        self.batch_day_load[lecture.batch * self.num_days + lecture.day] += 1
+
+    def remove(self, lecture):
+        key = lecture.day * self.slots_per_day + lecture.slot
+        self.teachers[key] &= ~(1 << lecture.teacher)
+        self.batches[key] &= ~(1 << lecture.batch)
+        self.rooms[key] &= ~(1 << lecture.room)
+        self.teacher_day_load[lecture.teacher * self.num_days + lecture.day] -= 1
+        self.batch_day_load[lecture.batch * self.num_days + lecture.day] -= 1
+
+    def teacher_busy(self, teacher, day, slot_idx):
+        return self.teachers[day * self.slots_per_day + slot_idx] >> teacher & 1
+
+    def batch_busy(self, batch, day, slot_idx):
+        return self.batches[day * self.slots_per_day + slot_idx] >> batch & 1
+
+    def room_mask(self, day, slot_idx):
+        return self.rooms[day * self.slots_per_day + slot_idx]
+
+    def slot_used(self, day, slot_idx):
+        return self.rooms[day * self.slots_per_day + slot_idx] != 0
+
+    def day_load(self, teacher, day):
+        return self.teacher_day_load[teacher * self.num_days + day]
+
+def random_room(mask):
+    """Index of a uniformly random set bit of a room bitmask"""
+    for _ in range(random.randrange(bin(mask).count('1'))):
+        mask &= mask - 1  # drop the lowest room
+    return (mask & -mask).bit_length() - 1
+
+def day_dissonance(slots, is_teacher):
+    """Gap penalty for one entity's day, plus 5 per run of three back-to-back classes for teachers"""
+    penalty = 0
+    if len(slots) > 1:
+        slots.sort()
+        penalty += (slots[-1] - slots[0] + 1) - len(slots)
+    if is_teacher and len(slots) >= 3:
+        for i in range(len(slots) - 2):
+            if slots[i+1] == slots[i] + 1 and slots[i+2] == slots[i] + 2: penalty += 5
+    return penalty
+
+def _gap_penalties(counts):
+    """Vectorized gap penalty of day_dissonance. counts has shape (harmonies, entity-days, slots);
+    returns the total per harmony."""
+    occupied = counts > 0
+    num_classes = counts.sum(axis=-1)
+    first = occupied.argmax(axis=-1)
+    last = counts.shape[-1] - 1 - occupied[..., ::-1].argmax(axis=-1)
+    return np.where(num_classes > 1, last - first + 1 - num_classes, 0).sum(axis=-1)
+
+def _back_to_back_penalties(counts):
+    """Vectorized three-in-a-row penalty of day_dissonance. In the sorted slot list, slots v, v+1
+    and v+2 form a run exactly when v and v+2 are used and v+1 is used once."""
+    runs = (counts[..., :-2] >= 1) & (counts[..., 1:-1] == 1) & (counts[..., 2:] >= 1)
+    return 5 * runs.sum(axis=(-2, -1))
+
+class DissonanceScorer:
+    """Caches the dissonance of every (batch|teacher, day) schedule of one timetable so that
+    moving or swapping lectures only rescores the day schedules it touches.
+
+    Day schedules are keyed by a single int: batch * num_days + day for batches, and the same
+    offset by num_batches * num_days for teachers."""
+    def __init__(self, timetable, num_days, num_batches):
+        self.num_days = num_days
+        self.teacher_offset = num_batches * num_days
+        self.day_slots = defaultdict(list)
+        for lecture in timetable:
+            self.day_slots[lecture.batch * num_days + lecture.day].append(lecture.slot)
+            self.day_slots[self.teacher_offset + lecture.teacher * num_days + lecture.day].append(lecture.slot)
+        self.contributions = {key: day_dissonance(slots, key >= self.teacher_offset) for key, slots in self.day_slots.items()}
+        self.total = sum(self.contributions.values())
+
+    def _rescore(self, key):
+        penalty = day_dissonance(self.day_slots[key], key >= self.teacher_offset)
+        self.total += penalty - self.contributions.get(key, 0)
+        self.contributions[key] = penalty
+
+    def move(self, lecture, day, slot_idx):
+        """Rescore as if lecture moved to (day, slot_idx); the lecture itself is left untouched"""
+        for base in (lecture.batch * self.num_days, self.teacher_offset + lecture.teacher * self.num_days):
+            old_key, new_key = base + lecture.day, base + day
+            self.day_slots[old_key].remove(lecture.slot)
+            self.day_slots[new_key].append(slot_idx)
+            self._rescore(old_key)
+            if new_key != old_key:
+                self._rescore(new_key)
+        return self.total
+
+    def add(self, lecture):
+        """Rescore with lecture added to the timetable"""
+        for key in (lecture.batch * self.num_days + lecture.day,
+                    self.teacher_offset + lecture.teacher * self.num_days + lecture.day):
+            self.day_slots[key].append(lecture.slot)
+            self._rescore(key)
+        return self.total
+
+    def remove(self, lecture):
+        """Rescore with lecture taken out of the timetable"""
+        for key in (lecture.batch * self.num_days + lecture.day,
+                    self.teacher_offset + lecture.teacher * self.num_days + lecture.day):
+            self.day_slots[key].remove(lecture.slot)
+            self._rescore(key)
+        return self.total
+
+    def swap(self, lec1, lec2):
+        """Rescore as if lec1 and lec2 exchanged day and slot. Calling it again after the
+        lectures have actually been swapped restores the previous scores."""
+        day1, slot1 = lec1.day, lec1.slot
+        self.move(lec1, lec2.day, lec2.slot)
+        self.move(lec2, day1, slot1)
+        return self.total
+
 class TemporalHarmonyScheduler:
     def __init__(self, config, rooms, teachers, batches, subjects):
         self.config = config
@@ -34,132 +239,253 @@ class TemporalHarmonyScheduler:
         self.subjects = subjects
         self.hms = config.get('HARMONY_MEMORY_SIZE', 20)
         self.par = config.get('PITCH_ADJUSTMENT_RATE', 0.3)
+        self.hmcr = config.get('MEMORY_CONSIDERATION_RATE', 0.05)
         self.iterations = config.get('NUM_GENERATIONS', 100)
-        
+        self.construction_mode = config.get('CONSTRUCTION_MODE', 'random')  # 'random' or 'greedy'
+        # Anytime limits: wall-clock seconds for a search, and how many iterations (run()) or
+        # construction attempts (search_harmonies) may pass without improving the best dissonance
+        self.time_budget = config.get('TIME_BUDGET_SECONDS')
+        self.patience = config.get('PATIENCE')
+        # Island model: independent harmony memories that pass their best harmony around a ring
+        # every MIGRATION_INTERVAL improvisations
+        self.islands = config.get('ISLANDS', 1)
+        self.migration_interval = config.get('MIGRATION_INTERVAL', 50)
+        # Share of the institution's lectures this scheduler places; below 1 for the subproblems
+        # of a decomposed institution, which scales the utilization acceptance threshold
+        self.utilization_share = 1.0
+        self.metrics = Metrics()
+        self._compile()
+
+    def _compile(self):
+        """Intern days, teachers, batches and rooms to integer indexes and build the lecture pool.
+        Everything inside the scheduler works on these indexes; export() turns a compiled
+        timetable back into the dict shape used by the API and the database."""
+        self.days = list(self.config['DAYS_OF_WEEK'])
+        self.num_days = len(self.days)
+        self.slots_per_day = self.config['SLOTS_PER_DAY']
+        day_index = {day: i for i, day in enumerate(self.days)}
+
+        self.teacher_ids, teacher_index = [], {}
+        self.batch_ids, batch_index = [], {}
+        for subject in self.subjects:
+            if subject["teacher"] not in teacher_index:
+                teacher_index[subject["teacher"]] = len(self.teacher_ids)
+                self.teacher_ids.append(subject["teacher"])
+            for batch_id in subject["batches"]:
+                if batch_id not in batch_index:
+                    batch_index[batch_id] = len(self.batch_ids)
+                    self.batch_ids.append(batch_id)
+        self.teacher_names = [self.teachers.get(t, {}).get("name", "N/A") for t in self.teacher_ids]
+        self.batch_names = [self.batches.get(b, {}).get("name", "N/A") for b in self.batch_ids]
+        self.batch_sizes = [self.batches.get(b, {}).get("size", 0) for b in self.batch_ids]
+
+        self.teacher_unavailable = []
+        for teacher_id in self.teacher_ids:
+            unavailable = set()
+            for u in self.teachers.get(teacher_id, {}).get("unavailable", []):
+                if isinstance(u, str) and '-' in u:
+                    d, s = u.split('-')
+                    u = (d, int(s))
+                if isinstance(u, tuple) and u[0] in day_index:
+                    unavailable.add((day_index[u[0]], u[1]))
+            self.teacher_unavailable.append(unavailable)
+
+        self.room_ids = [r['id'] for r in self.rooms]
+        self.room_capacities = [r['capacity'] for r in self.rooms]
+        self.room_is_lab = [r['room_type'].lower() == 'lab' if r.get('room_type') else "LAB" in r['id'].upper()
+                            for r in self.rooms]
+        self.all_rooms_mask = (1 << len(self.rooms)) - 1
+
+        # Rooms bucketed by lab/lecture type and sorted by capacity. suffix_masks[i] is the bitmask of
+        # the bucket's rooms from position i on, so the rooms big enough for a batch are one bisect away.
+        self._room_buckets = {}
+        for is_lab in (False, True):
+            bucket = sorted((r for r in range(len(self.rooms)) if self.room_is_lab[r] == is_lab),
+                            key=lambda r: self.room_capacities[r])
+            suffix_masks = [0] * (len(bucket) + 1)
+            for i in range(len(bucket) - 1, -1, -1):
+                suffix_masks[i] = suffix_masks[i + 1] | 1 << bucket[i]
+            self._room_buckets[is_lab] = ([self.room_capacities[r] for r in bucket], suffix_masks)
+        self._suitable_masks = {}
+
+        self.subject_needs_lab = [subject.get("needs_lab", False) for subject in self.subjects]
+        self.lecture_pool = []
+        for subject_idx, subject in enumerate(self.subjects):
+            for batch_id in subject["batches"]:
+                for _ in range(subject["per_week"]):
+                    self.lecture_pool.append(Lecture(subject_idx, teacher_index[subject["teacher"]], batch_index[batch_id]))
+
+    def _suitable_rooms_mask(self, batch_size, needs_lab):
+        """Bitmask of the rooms of the right type with capacity for batch_size"""
+        key = (batch_size, bool(needs_lab))
+        if key not in self._suitable_masks:
+            capacities, suffix_masks = self._room_buckets[key[1]]
+            self._suitable_masks[key] = suffix_masks[bisect_left(capacities, batch_size)]
+        return self._suitable_masks[key]
+
+    def export(self, timetable):
+        """Convert a compiled timetable to the list of slot dicts returned by the API"""
+        return [{
+            "subject_id": self.subjects[lec.subject]["id"],
+            "teacher_id": self.teacher_ids[lec.teacher],
+            "batch_id": self.batch_ids[lec.batch],
+            "subject_name": self.subjects[lec.subject]["name"],
+            "needs_lab": self.subject_needs_lab[lec.subject],
+            "teacher_name": self.teacher_names[lec.teacher],
+            "batch_name": self.batch_names[lec.batch],
+            "batch_size": self.batch_sizes[lec.batch],
+            "day": self.days[lec.day],
+            "slot_index": lec.slot,
+            "room_id": self.room_ids[lec.room]
+        } for lec in timetable]
+
+    def compile_timetable(self, slots):
+        """Inverse of export(): compile a list of slot dicts, or None if one of them refers to a
+        subject, teacher, batch, room or time this scheduler does not know"""
+        subject_index = {subject["id"]: i for i, subject in enumerate(self.subjects)}
+        teacher_index = {t: i for i, t in enumerate(self.teacher_ids)}
+        batch_index = {b: i for i, b in enumerate(self.batch_ids)}
+        room_index = {r: i for i, r in enumerate(self.room_ids)}
+        day_index = {d: i for i, d in enumerate(self.days)}
+        try:
+            timetable = [Lecture(subject_index[slot["subject_id"]], teacher_index[slot["teacher_id"]],
+                                 batch_index[slot["batch_id"]], room_index[slot["room_id"]],
+                                 day_index[slot["day"]], slot["slot_index"]) for slot in slots]
+        except (KeyError, TypeError):
+            return None
+        if any(not 0 <= lec.slot < self.slots_per_day for lec in timetable):
+            return None
+        return timetable
+
+    def _new_occupancy(self, timetable=()):
+        return OccupancyIndex(self.num_days, self.slots_per_day, len(self.teacher_ids), timetable)
+
     def _calculate_dissonance(self, timetable):
         if timetable is None: return float('inf')
-        penalty = 0
-        batch_schedules = defaultdict(lambda: defaultdict(list))
-        teacher_schedules = defaultdict(lambda: defaultdict(list))
-        for slot in timetable:
-            batch_schedules[slot['batch_id']][slot['day']].append(slot['slot_index'])
-            teacher_schedules[slot['teacher_id']][slot['day']].append(slot['slot_index'])
-        for schedules in [batch_schedules, teacher_schedules]:
-            for day_schedule in schedules.values():
-                for slots in day_schedule.values():
-                    if len(slots) > 1:
-                        slots.sort()
-                        penalty += (slots[-1] - slots[0] + 1) - len(slots)
-        for day_schedule in teacher_schedules.values():
-            for slots in day_schedule.values():
-                if len(slots) >= 3:
-                    slots.sort()
-                    for i in range(len(slots) - 2):
-                        if slots[i+1] == slots[i] + 1 and slots[i+2] == slots[i] + 2: penalty += 5
-        return penalty
-
-    def _get_valid_slots_for_lecture(self, lecture, timetable):
+        return DissonanceScorer(timetable, self.num_days, len(self.batch_ids)).total
+
+    def _evaluate_batch(self, harmonies):
+        """_calculate_dissonance for many harmonies in one vectorized pass. The lectures of every
+        harmony are stacked and scattered into per-(harmony, entity, day, slot) occupancy counts, from
+        which the gap and back-to-back penalties of all harmonies are computed at once."""
+        if not harmonies:
+            return []
+        num_harmonies, num_days, num_slots = len(harmonies), self.num_days, self.slots_per_day
+        owner = np.repeat(np.arange(num_harmonies), [len(h) for h in harmonies])
+        fields = np.array([(lec.batch, lec.teacher, lec.day, lec.slot) for h in harmonies for lec in h],
+                          dtype=np.int64).reshape(-1, 4)
+        batch, teacher, day, slot = fields.T
+        penalty = np.zeros(num_harmonies, dtype=np.int64)
+        for entity, num_entities, is_teacher in ((batch, len(self.batch_ids), False), (teacher, len(self.teacher_ids), True)):
+            flat = ((owner * num_entities + entity) * num_days + day) * num_slots + slot
+            counts = np.bincount(flat, minlength=num_harmonies * num_entities * num_days * num_slots)
+            counts = counts.reshape(num_harmonies, num_entities * num_days, num_slots)
+            penalty += _gap_penalties(counts)
+            if is_teacher:
+                penalty += _back_to_back_penalties(counts)
+        return penalty.tolist()
+
+    def _has_clashes(self, timetable):
+        """has_clashes() for a compiled timetable"""
+        room_usage = set()
+        teacher_usage = set()
+        batch_usage = set()
+        day_batch_count = defaultdict(int)
+        num_slots = self.num_days * self.slots_per_day
+        for lec in timetable:
+            slot_key = lec.day * self.slots_per_day + lec.slot
+            key_room = lec.room * num_slots + slot_key
+            key_teacher = lec.teacher * num_slots + slot_key
+            key_batch = lec.batch * num_slots + slot_key
+            if key_room in room_usage or key_teacher in teacher_usage or key_batch in batch_usage:
+                return True
+            room_usage.add(key_room)
+            teacher_usage.add(key_teacher)
+            batch_usage.add(key_batch)
+            # Max classes per day (relaxed to 6 classes max)
+            day_batch_count[lec.batch * self.num_days + lec.day] += 1
+            if day_batch_count[lec.batch * self.num_days + lec.day] > 6:
+                return True
+        return False
+
+    def _fits(self, occupancy, lecture, room, day, slot_idx):
+        """Whether lecture can take room at (day, slot_idx) under the constraints the constructors enforce"""
+        return not ((day, slot_idx) in self.teacher_unavailable[lecture.teacher] or
+                    occupancy.teacher_busy(lecture.teacher, day, slot_idx) or
+                    occupancy.batch_busy(lecture.batch, day, slot_idx) or
+                    occupancy.room_mask(day, slot_idx) >> room & 1 or
+                    occupancy.day_load(lecture.teacher, day) >= 4 or
+                    occupancy.batch_day_load[lecture.batch * self.num_days + day] >= 6)
+
+    def _swap_is_clash_free(self, occupancy, lec1, lec2):
+        """Whether exchanging the day and slot of two lectures keeps a clash-free timetable clash-free.
+        occupancy indexes the timetable and is left as it was."""
+        occupancy.remove(lec1)
+        occupancy.remove(lec2)
+        clash_free = True
+        for lecture, day, slot_idx in ((lec1, lec2.day, lec2.slot), (lec2, lec1.day, lec1.slot)):
+            if not self._fits(occupancy, lecture, lecture.room, day, slot_idx):
+                clash_free = False
+                break
+        occupancy.place(lec1)
+        occupancy.place(lec2)
+        return clash_free
+
+    def _get_valid_slots_for_lecture(self, lecture, timetable, occupancy=None):
+        if occupancy is None:
+            occupancy = self._new_occupancy(timetable)
         valid_slots = []
-        all_possible_slots = [(d, s) for d in self.config['DAYS_OF_WEEK'] for s in range(self.config['SLOTS_PER_DAY'])]
-        teacher_info = self.teachers.get(lecture['teacher_id'], {})
-        unavailable_slots = []
-        for u in teacher_info.get("unavailable", []):
-            if isinstance(u, str) and '-' in u:
-                d, s = u.split('-')
-                unavailable_slots.append((d, int(s)))
-            elif isinstance(u, tuple):
-                unavailable_slots.append(u)
-        for day, slot_idx in all_possible_slots:
-            if (day, slot_idx) in unavailable_slots: continue
-            if any(l['teacher_id'] == lecture['teacher_id'] and l['day'] == day and l['slot_index'] == slot_idx for l in timetable): continue
-            if any(l['batch_id'] == lecture['batch_id'] and l['day'] == day and l['slot_index'] == slot_idx for l in timetable): continue
-            valid_slots.append((day, slot_idx))
+        unavailable_slots = self.teacher_unavailable[lecture.teacher]
+        for day in range(self.num_days):
+            for slot_idx in range(self.slots_per_day):
+                if (day, slot_idx) in unavailable_slots: continue
+                if occupancy.teacher_busy(lecture.teacher, day, slot_idx): continue
+                if occupancy.batch_busy(lecture.batch, day, slot_idx): continue
+                valid_slots.append((day, slot_idx))
         return valid_slots
 
     def _generate_random_valid_timetable(self):
         """Generate a complete timetable with balanced distribution across all days"""
         timetable = []
+        occupancy = self._new_occupancy()
 
         # Create a pool of all lectures that need to be scheduled
-        all_lectures = []
-        for subject in self.subjects:
-            num_to_schedule = subject["per_week"]
-            for batch_id in subject["batches"]:
-                for _ in range(num_to_schedule):
-                    teacher_id = subject["teacher"]
-                    batch_info = self.batches.get(batch_id, {})
-                    teacher_info = self.teachers.get(teacher_id, {})
-                    lecture = {
-                        "subject_id": subject["id"],
-                        "teacher_id": teacher_id,
-                        "batch_id": batch_id,
-                        "subject_name": subject["name"],
-                        "needs_lab": subject.get("needs_lab", False),
-                        "teacher_name": teacher_info.get("name", "N/A"),
-                        "batch_name": batch_info.get("name", "N/A"),
-                        "batch_size": batch_info.get("size", 0)
-                    }
-                    all_lectures.append(lecture)
+        all_lectures = self.lecture_pool[:]
 
         # Shuffle lectures to create different combinations
         random.shuffle(all_lectures)
 
-        # Distribute lectures evenly across all days and slots first
-        lectures_per_day = {}
-        for i, day in enumerate(self.config['DAYS_OF_WEEK']):
-            lectures_per_day[day] = []
-
         # Distribute lectures round-robin style across days
-        for i, lecture in enumerate(all_lectures):
-            day_index = i % len(self.config['DAYS_OF_WEEK'])
-            day = self.config['DAYS_OF_WEEK'][day_index]
-            lectures_per_day[day].append(lecture)
+        lectures_per_day = [all_lectures[day::self.num_days] for day in range(self.num_days)]
 
         # Now schedule each day's lectures into available slots
-        for day in self.config['DAYS_OF_WEEK']:
+        for day in range(self.num_days):
             day_lectures = lectures_per_day[day][:]  # Copy the list
             random.shuffle(day_lectures)  # Shuffle within the day
 
-            # Track teacher workload for this day
-            teacher_workload = {}
-
             # For each slot, try to find a suitable lecture
-            for slot_idx in range(self.config['SLOTS_PER_DAY']):
-                # Try to find a lecture that can be scheduled in this slot - ensure ALL slots are considered
-                lecture_scheduled = False
-
+            for slot_idx in range(self.slots_per_day):
                 # Shuffle lectures for this attempt to get different combinations
                 available_lectures = [lec for lec in day_lectures
-                                    if teacher_workload.get(lec['teacher_id'], 0) < 4]  # Respect teacher limits
+                                    if occupancy.day_load(lec.teacher, day) < 4]  # Respect teacher limits
 
                 random.shuffle(available_lectures)
 
                 for lecture in available_lectures:
                     # Check if this batch already has a class in this slot
-                    batch_conflict = any(l for l in timetable
-                                       if l['day'] == day and l['slot_index'] == slot_idx
-                                       and l['batch_id'] == lecture['batch_id'])
-                    if batch_conflict:
+                    if occupancy.batch_busy(lecture.batch, day, slot_idx):
                         continue
 
                     # Check if this teacher already has a class in this slot
-                    teacher_conflict = any(l for l in timetable
-                                         if l['day'] == day and l['slot_index'] == slot_idx
-                                         and l['teacher_id'] == lecture['teacher_id'])
-                    if teacher_conflict:
+                    if occupancy.teacher_busy(lecture.teacher, day, slot_idx):
                         continue
 
                     # Find available room for this slot
-                    occupied_rooms = [l['room_id'] for l in timetable
-                                    if l['day'] == day and l['slot_index'] == slot_idx]
-                    available_rooms = [r for r in self.rooms if r['id'] not in occupied_rooms]
+                    available_rooms = self.all_rooms_mask & ~occupancy.room_mask(day, slot_idx)
 
                     # Filter suitable rooms
-                    suitable_rooms = [r for r in available_rooms if r['capacity'] >= lecture["batch_size"]]
-                    if lecture["needs_lab"]:
-                        suitable_rooms = [r for r in suitable_rooms if "LAB" in r['id'].upper()]
-                    else:
-                        suitable_rooms = [r for r in suitable_rooms if "LAB" not in r['id'].upper()]
+                    suitable_rooms = available_rooms & self._suitable_rooms_mask(
+                        self.batch_sizes[lecture.batch], self.subject_needs_lab[lecture.subject])
 
                     # If no suitable rooms, try any available room
                     if not suitable_rooms:
@@ -167,14 +493,10 @@ class TemporalHarmonyScheduler:
 
                     if suitable_rooms:
                         # Schedule this lecture
-                        assigned_lecture = lecture.copy()
-                        assigned_lecture['day'] = day
-                        assigned_lecture['slot_index'] = slot_idx
-                        assigned_lecture['room_id'] = random.choice(suitable_rooms)['id']
+                        assigned_lecture = lecture.placed(random_room(suitable_rooms), day, slot_idx)
                         timetable.append(assigned_lecture)
-                        teacher_workload[lecture['teacher_id']] = teacher_workload.get(lecture['teacher_id'], 0) + 1
+                        occupancy.place(assigned_lecture)
                         day_lectures.remove(lecture)  # Remove from available lectures
-                        lecture_scheduled = True
                         break
 
                 # If no lecture could be scheduled for this slot, continue to next slot
@@ -182,60 +504,46 @@ class TemporalHarmonyScheduler:
 
         # Second pass: Try to fill empty slots more aggressively
         remaining_lectures = []
-        for day in self.config['DAYS_OF_WEEK']:
+        for day in range(self.num_days):
             remaining_lectures.extend(lectures_per_day[day])
 
         # Remove already scheduled lectures
-        scheduled_lecture_ids = {(lec['subject_id'], lec['batch_id'], lec['teacher_id']) for lec in timetable}
+        scheduled_lecture_ids = {(lec.subject, lec.batch, lec.teacher) for lec in timetable}
         remaining_lectures = [lec for lec in remaining_lectures
-                            if (lec['subject_id'], lec['batch_id'], lec['teacher_id']) not in scheduled_lecture_ids]
+                            if (lec.subject, lec.batch, lec.teacher) not in scheduled_lecture_ids]
 
         # Try to fill empty slots with remaining lectures
-        for day in self.config['DAYS_OF_WEEK']:
-            teacher_workload = {lec['teacher_id']: len([t for t in timetable if t['day'] == day and t['teacher_id'] == lec['teacher_id']]) for lec in remaining_lectures}
-
-            for slot_idx in range(self.config['SLOTS_PER_DAY']):
+        for day in range(self.num_days):
+            for slot_idx in range(self.slots_per_day):
                 # Check if this slot is already filled
-                slot_filled = any(l for l in timetable if l['day'] == day and l['slot_index'] == slot_idx)
-                if slot_filled:
+                if occupancy.slot_used(day, slot_idx):
                     continue
 
                 # Try to schedule a remaining lecture in this empty slot
                 random.shuffle(remaining_lectures)
                 for lecture in remaining_lectures:
-                    if teacher_workload.get(lecture['teacher_id'], 0) >= 4:
+                    if occupancy.day_load(lecture.teacher, day) >= 4:
                         continue
 
                     # Check conflicts (relaxed for second pass)
-                    batch_conflict = any(l for l in timetable
-                                       if l['day'] == day and l['slot_index'] == slot_idx
-                                       and l['batch_id'] == lecture['batch_id'])
-                    if batch_conflict:
+                    if occupancy.batch_busy(lecture.batch, day, slot_idx):
                         continue
 
-                    teacher_conflict = any(l for l in timetable
-                                         if l['day'] == day and l['slot_index'] == slot_idx
-                                         and l['teacher_id'] == lecture['teacher_id'])
-                    if teacher_conflict:
+                    if occupancy.teacher_busy(lecture.teacher, day, slot_idx):
                         continue
 
                     # Find any available room
-                    occupied_rooms = [l['room_id'] for l in timetable
-                                    if l['day'] == day and l['slot_index'] == slot_idx]
-                    available_rooms = [r for r in self.rooms if r['id'] not in occupied_rooms]
+                    available_rooms = self.all_rooms_mask & ~occupancy.room_mask(day, slot_idx)
 
                     if available_rooms:
                         # Schedule this lecture
-                        assigned_lecture = lecture.copy()
-                        assigned_lecture['day'] = day
-                        assigned_lecture['slot_index'] = slot_idx
-                        assigned_lecture['room_id'] = random.choice(available_rooms)['id']
+                        assigned_lecture = lecture.placed(random_room(available_rooms), day, slot_idx)
                         timetable.append(assigned_lecture)
-                        teacher_workload[lecture['teacher_id']] = teacher_workload.get(lecture['teacher_id'], 0) + 1
+                        occupancy.place(assigned_lecture)
                         remaining_lectures.remove(lecture)
                         break
-        days_with_classes = set(slot['day'] for slot in timetable)
-        if len(days_with_classes) < len(self.config['DAYS_OF_WEEK']) * 0.8:  # At least 80% of days
+        days_with_classes = set(lec.day for lec in timetable)
+        if len(days_with_classes) < self.num_days * 0.8:  # At least 80% of days
             return None
 
         if len(timetable) < len(all_lectures) * 0.5:  # At least 50% of lectures scheduled
@@ -243,34 +551,738 @@ class TemporalHarmonyScheduler:
 
         return timetable
 
-    def run(self):
-        harmony_memory = []
+    def _construct(self):
+        """Build one candidate timetable with the configured CONSTRUCTION_MODE"""
+        if self.construction_mode == 'greedy':
+            return self._generate_greedy_timetable()
+        return self._generate_random_valid_timetable()
+
+    def _generate_greedy_timetable(self):
+        """Constraint-ordered construction. Lectures of the same subject and batch form a group that
+        shares one domain of feasible (day, slot) cells. The group with the fewest feasible cells goes
+        next, lab-needing and larger batches first on ties, and every placement forward-checks the
+        domains of the groups sharing its teacher or batch. Unlike the random constructor, lectures of
+        different batches can run in parallel, one per free room."""
+        num_days, slots_per_day = self.num_days, self.slots_per_day
+        num_cells = num_days * slots_per_day
+        day_cells = [range(day * slots_per_day, (day + 1) * slots_per_day) for day in range(num_days)]
+        occupancy = self._new_occupancy()
+        batch_day_load = [0] * (len(self.batch_ids) * num_days)
+
+        # Group identical lectures; their domain starts as every cell their teacher is available in
+        groups = {}
+        for lecture in self.lecture_pool:
+            key = (lecture.subject, lecture.batch)
+            if key in groups:
+                groups[key][1] += 1
+            else:
+                unavailable = self.teacher_unavailable[lecture.teacher]
+                domain = {cell for cell in range(num_cells) if divmod(cell, slots_per_day) not in unavailable}
+                groups[key] = [lecture, 1, domain]
+        groups = list(groups.values())
+        teacher_groups = defaultdict(list)
+        batch_groups = defaultdict(list)
+        for g, (lecture, _, _) in enumerate(groups):
+            teacher_groups[lecture.teacher].append(g)
+            batch_groups[lecture.batch].append(g)
+
+        # Min-heap on domain size with lazy invalidation: stale entries carry an old version
+        versions = [0] * len(groups)
+        def priority(g):
+            lecture, _, domain = groups[g]
+            return (len(domain), not self.subject_needs_lab[lecture.subject], -self.batch_sizes[lecture.batch],
+                    random.random(), versions[g], g)
+        heap = [priority(g) for g in range(len(groups))]
+        heapq.heapify(heap)
+
+        def prune(group_ids, cells):
+            for g2 in group_ids:
+                domain = groups[g2][2]
+                before = len(domain)
+                domain.difference_update(cells)
+                if len(domain) != before and groups[g2][1] > 0:
+                    versions[g2] += 1
+                    heapq.heappush(heap, priority(g2))
+
+        timetable = []
+        while heap:
+            *_, version, g = heapq.heappop(heap)
+            lecture, remaining, domain = groups[g]
+            if version != versions[g] or remaining == 0 or not domain:
+                continue
+
+            # Spread the batch over the week, then keep its day compact
+            def cell_cost(cell):
+                day, slot_idx = divmod(cell, slots_per_day)
+                used = [s for s in range(slots_per_day) if occupancy.batch_busy(lecture.batch, day, s)]
+                gap = min(abs(slot_idx - s) for s in used) - 1 if used else 0
+                return (batch_day_load[lecture.batch * num_days + day], gap, random.random())
+            cell = min(domain, key=cell_cost)
+            day, slot_idx = divmod(cell, slots_per_day)
+
+            available_rooms = self.all_rooms_mask & ~occupancy.room_mask(day, slot_idx)
+            suitable_rooms = available_rooms & self._suitable_rooms_mask(
+                self.batch_sizes[lecture.batch], self.subject_needs_lab[lecture.subject])
+            if not available_rooms:
+                return None
+            placed = lecture.placed(random_room(suitable_rooms or available_rooms), day, slot_idx)
+            timetable.append(placed)
+            occupancy.place(placed)
+            batch_day_load[lecture.batch * num_days + day] += 1
+            groups[g][1] -= 1
+
+            # Forward checking
+            prune(set(teacher_groups[lecture.teacher]) | set(batch_groups[lecture.batch]), (cell,))
+            if occupancy.day_load(lecture.teacher, day) >= 4:
+                prune(teacher_groups[lecture.teacher], day_cells[day])
+            if batch_day_load[lecture.batch * num_days + day] >= 6:
+                prune(batch_groups[lecture.batch], day_cells[day])
+            if not available_rooms & ~(1 << placed.room):
+                prune(range(len(groups)), (cell,))
+            if groups[g][1] > 0:
+                versions[g] += 1
+                heapq.heappush(heap, priority(g))
+
+        days_with_classes = set(lec.day for lec in timetable)
+        if len(days_with_classes) < self.num_days * 0.8:  # At least 80% of days
+            return None
+
+        if len(timetable) < len(self.lecture_pool) * 0.5:  # At least 50% of lectures scheduled
+            return None
+
+        return timetable
+
+    def _rejection_reason(self, harmony, relaxed=False):
+        """Why generate()'s acceptance test rejects harmony, or None if it passes. Strict:
+        clash-free, classes on every day and at least 85% of the weekly slots filled. Relaxed:
+        classes on at least 80% of the days."""
+        if not harmony:
+            return 'incomplete'
+        days_with_classes = set(lec.day for lec in harmony)
+        if relaxed:
+            return None if len(days_with_classes) >= self.num_days * 0.8 else 'missing_days'
+        with self.metrics.timer('clash_check'):
+            if self._has_clashes(harmony):
+                return 'clashes'
+        if len(days_with_classes) < min(self.num_days, len(self.lecture_pool)):  # Use ALL days
+            return 'missing_days'
+        if len(harmony) / (self.num_days * self.slots_per_day) < 0.85 * self.utilization_share:  # At least 85% of slots filled
+            return 'low_utilization'
+        return None
+
+    def _is_acceptable(self, harmony, relaxed=False):
+        return self._rejection_reason(harmony, relaxed) is None
+
+    def _deadline(self):
+        """time.monotonic() at which a search starting now must stop, or None without a budget"""
+        return time.monotonic() + self.time_budget if self.time_budget else None
+
+    def _search(self, max_attempts, target, relaxed=False, deadline=None):
+        """Construct timetables until target acceptable ones are found, max_attempts run out or the
+        deadline passes. Returns the (harmony, dissonance) pairs found, the number of attempts made
+        and the time.monotonic() of the first acceptable harmony (None if there was none)."""
+        found = []
+        attempts = 0
+        first_valid_at = None
+        while attempts < max_attempts and len(found) < target:
+            if deadline is not None and attempts and time.monotonic() >= deadline:
+                break
+            attempts += 1
+            with self.metrics.timer('construction', mode=self.construction_mode):
+                new_harmony = self._construct()
+            reason = self._rejection_reason(new_harmony, relaxed)
+            if reason is None:
+                found.append(new_harmony)
+                if first_valid_at is None:
+                    first_valid_at = time.monotonic()
+            else:
+                self.metrics.inc('harmonies_rejected', reason=reason)
+        self.metrics.inc('construction_attempts', attempts)
+        self.metrics.inc('harmonies_accepted', len(found))
+        with self.metrics.timer('scoring'):
+            scores = self._evaluate_batch(found)
+        return list(zip(found, scores)), attempts, first_valid_at
+
+    def _initial_memory(self, deadline=None):
+        """Construct up to hms harmonies (hms * 3 attempts) and return them as a harmony memory of
+        (harmony, dissonance) pairs sorted best first, or None if nothing could be constructed."""
+        harmonies = []
         for _ in range(self.hms * 3):
-              if len(harmony_memory) >= self.hms: break
-              new_harmony = self._generate_random_valid_timetable()
-              if new_harmony: harmony_memory.append((new_harmony, self._calculate_dissonance(new_harmony)))
-        if not harmony_memory: return None
+              if len(harmonies) >= self.hms: break
+              if deadline is not None and harmonies and time.monotonic() >= deadline: break
+              new_harmony = self._construct()
+              if new_harmony: harmonies.append(new_harmony)
+        if not harmonies: return None
+        harmony_memory = list(zip(harmonies, self._evaluate_batch(harmonies)))
         harmony_memory.sort(key=lambda x: x[1])
-        harmony_memory = harmony_memory[:self.hms]
-        for i in range(self.iterations):
-            base_harmony = harmony_memory[0][0]
-            mutated_harmony = copy.deepcopy(base_harmony)
-            if random.random() < self.par and len(mutated_harmony) > 1:
-                lec1_idx, lec2_idx = random.sample(range(len(mutated_harmony)), 2)
-                lec1, lec2 = mutated_harmony[lec1_idx], mutated_harmony[lec2_idx]
-                lec1['day'], lec2['day'] = lec2['day'], lec1['day']
-                lec1['slot_index'], lec2['slot_index'] = lec2['slot_index'], lec1['slot_index']
-            new_dissonance = self._calculate_dissonance(mutated_harmony)
-            if new_dissonance < harmony_memory[-1][1]:
-                harmony_memory[-1] = (mutated_harmony, new_dissonance)
-                harmony_memory.sort(key=lambda x: x[1])
-        return harmony_memory[0][0]
+        return harmony_memory[:self.hms]
+
+    def _signature(self, harmony):
+        """Hashable identity of a harmony, independent of the order of its lectures"""
+        return frozenset((lec.subject, lec.batch, lec.room, lec.day, lec.slot) for lec in harmony)
+
+    def improvise(self, harmony_memory, iterations, deadline=None):
+        """Run up to iterations improvisations on harmony_memory (sorted best first) in place; returns how many ran"""
+        states = {}  # id(harmony) -> (scorer, occupancy) for harmonies that have been considered
+        placements = {}  # id(harmony) -> {(subject, batch): [lecture, ...]} for harmonies drawn from
+        signatures = {id(harmony): self._signature(harmony) for harmony, _ in harmony_memory}
+        best_dissonance, stale_iterations = harmony_memory[0][1], 0
+        for i in range(iterations):
+            if deadline is not None and time.monotonic() >= deadline:
+                return i
+            if self.patience is not None and stale_iterations >= self.patience:
+                return i
+            base_harmony, base_dissonance = random.choice(harmony_memory)
+            if id(base_harmony) not in states:
+                states[id(base_harmony)] = (DissonanceScorer(base_harmony, self.num_days, len(self.batch_ids)),
+                                            self._new_occupancy(base_harmony))
+            scorer, occupancy = states[id(base_harmony)]
+            # Moves are applied to base_harmony in place and rolled back from the undo log
+            # afterwards. Moved lectures are replaced, never mutated, because harmonies in
+            # memory share their untouched lectures.
+            undo_log = []
+            new_dissonance = base_dissonance
+
+            # Memory consideration: each lecture, at MEMORY_CONSIDERATION_RATE, takes the placement
+            # it has in a harmony drawn from the whole memory, where that fits
+            for idx, lecture in enumerate(base_harmony):
+                if random.random() >= self.hmcr:
+                    continue
+                donor = random.choice(harmony_memory)[0]
+                if donor is base_harmony:
+                    continue
+                if id(donor) not in placements:
+                    placements[id(donor)] = defaultdict(list)
+                    for lec in donor:
+                        placements[id(donor)][lec.subject, lec.batch].append(lec)
+                choices = placements[id(donor)].get((lecture.subject, lecture.batch))
+                if not choices:
+                    continue
+                choice = random.choice(choices)
+                if (choice.room, choice.day, choice.slot) == (lecture.room, lecture.day, lecture.slot):
+                    continue
+                occupancy.remove(lecture)
+                if self._fits(occupancy, lecture, choice.room, choice.day, choice.slot):
+                    new_dissonance = scorer.move(lecture, choice.day, choice.slot)
+                    base_harmony[idx] = lecture.placed(choice.room, choice.day, choice.slot)
+                    undo_log.append((idx, lecture))
+                occupancy.place(base_harmony[idx])
+
+            # Pitch adjustment: a clash-free swap of two lectures' day and slot
+            if random.random() < self.par and len(base_harmony) > 1:
+                lec1_idx, lec2_idx = random.sample(range(len(base_harmony)), 2)
+                lec1, lec2 = base_harmony[lec1_idx], base_harmony[lec2_idx]
+                if self._swap_is_clash_free(occupancy, lec1, lec2):
+                    new_dissonance = scorer.swap(lec1, lec2)
+                    occupancy.remove(lec1)
+                    occupancy.remove(lec2)
+                    base_harmony[lec1_idx] = lec1.placed(lec1.room, lec2.day, lec2.slot)
+                    base_harmony[lec2_idx] = lec2.placed(lec2.room, lec1.day, lec1.slot)
+                    occupancy.place(base_harmony[lec1_idx])
+                    occupancy.place(base_harmony[lec2_idx])
+                    undo_log += [(lec1_idx, lec1), (lec2_idx, lec2)]
+
+            if undo_log and new_dissonance < harmony_memory[-1][1]:
+                signature = self._signature(base_harmony)
+                if signature not in signatures.values():
+                    worst = id(harmony_memory[-1][0])
+                    states.pop(worst, None)
+                    placements.pop(worst, None)
+                    del signatures[worst]
+                    harmony_memory[-1] = (list(base_harmony), new_dissonance)
+                    signatures[id(harmony_memory[-1][0])] = signature
+                    harmony_memory.sort(key=lambda x: x[1])
+            touched = {idx for idx, _ in undo_log}
+            for idx in touched:
+                occupancy.remove(base_harmony[idx])
+            for idx, lecture in reversed(undo_log):
+                scorer.move(base_harmony[idx], lecture.day, lecture.slot)  # back to base_harmony's scores
+                base_harmony[idx] = lecture
+            for idx in touched:
+                occupancy.place(base_harmony[idx])
+            if harmony_memory[0][1] < best_dissonance:
+                best_dissonance, stale_iterations = harmony_memory[0][1], 0
+            else:
+                stale_iterations += 1
+        return iterations
+
+    def run(self):
+        """Harmony search. Stops after NUM_GENERATIONS improvisations, when TIME_BUDGET_SECONDS run
+        out or after PATIENCE improvisations without a better harmony, and returns the best found.
+        With ISLANDS > 1 the search runs as an island model, see run_islands()."""
+        if self.islands > 1:
+            return run_islands(self, workers=min(self.islands, os.cpu_count() or 1))
+        deadline = self._deadline()
+        harmony_memory = self._initial_memory(deadline)
+        if not harmony_memory: return None
+        with self.metrics.timer('improvisation'):
+            self.metrics.inc('improvisations', self.improvise(harmony_memory, self.iterations, deadline))
+        return self.export(harmony_memory[0][0])
+
+    def subproblems(self):
+        """Split the institution into independent schedulers, one per connected component of the
+        graph joining batches that share a teacher or a candidate room. Timetables of different
+        components can never clash, so each can be searched on its own and the results merged.
+        A lecture no room suits may use any room, like in the constructors, so it shares every
+        room. Components with too few lectures to pass the constructors' 80%-of-days check are
+        searched together, or with the smallest other component. Returns [] when everything is
+        connected."""
+        if not self.rooms:
+            return []
+        parent = list(range(len(self.batch_ids)))
+
+        def find(b):
+            while parent[b] != b:
+                parent[b] = parent[parent[b]]
+                b = parent[b]
+            return b
+
+        first_batch = {}  # ('teacher' or 'room', index) -> first batch seen using it
+        batch_rooms = [0] * len(self.batch_ids)
+        for lec in self.lecture_pool:
+            parent[find(lec.batch)] = find(first_batch.setdefault(('teacher', lec.teacher), lec.batch))
+            batch_rooms[lec.batch] |= (self._suitable_rooms_mask(self.batch_sizes[lec.batch],
+                                                                 self.subject_needs_lab[lec.subject])
+                                       or self.all_rooms_mask)
+        for b, mask in enumerate(batch_rooms):
+            while mask:
+                room = (mask & -mask).bit_length() - 1
+                parent[find(b)] = find(first_batch.setdefault(('room', room), b))
+                mask &= mask - 1
+        components = defaultdict(list)
+        for b in range(len(self.batch_ids)):
+            components[find(b)].append(b)
+        batch_lectures = [0] * len(self.batch_ids)
+        for lec in self.lecture_pool:
+            batch_lectures[lec.batch] += 1
+        min_lectures = math.ceil(self.num_days * 0.8)
+        groups, small = [], []
+        for members in sorted(components.values(), key=lambda m: sum(batch_lectures[b] for b in m)):
+            if sum(batch_lectures[b] for b in members) >= min_lectures:
+                groups.append(members)
+            else:
+                small += members
+        if small:
+            if groups and sum(batch_lectures[b] for b in small) < min_lectures:
+                groups[0] = groups[0] + small
+            else:
+                groups.append(small)
+        if len(groups) < 2:
+            return []
+
+        schedulers = []
+        for members in groups:
+            batch_ids = {self.batch_ids[b] for b in members}
+            rooms_mask = 0
+            for b in members:
+                rooms_mask |= batch_rooms[b]
+            subjects = [s for s in self.subjects if batch_ids.intersection(s["batches"])]
+            sub = TemporalHarmonyScheduler(
+                self.config, [room for r, room in enumerate(self.rooms) if rooms_mask >> r & 1],
+                {s["teacher"]: self.teachers[s["teacher"]] for s in subjects if s["teacher"] in self.teachers},
+                {b: self.batches[b] for b in batch_ids if b in self.batches}, subjects)
+            sub.utilization_share = len(sub.lecture_pool) / len(self.lecture_pool)
+            schedulers.append(sub)
+        return schedulers
+
+    def _placements(self, lecture, occupancy, room_mask):
+        """Clash-free (day, slot, rooms bitmask) placements of lecture among the rooms in room_mask,
+        preferring rooms of the right type and size like the constructors do"""
+        suitable = room_mask & self._suitable_rooms_mask(self.batch_sizes[lecture.batch],
+                                                         self.subject_needs_lab[lecture.subject])
+        unavailable = self.teacher_unavailable[lecture.teacher]
+        placements = []
+        for day in range(self.num_days):
+            if occupancy.batch_day_load[lecture.batch * self.num_days + day] >= 6: continue
+            for slot_idx in range(self.slots_per_day):
+                if (day, slot_idx) in unavailable: continue
+                if occupancy.teacher_busy(lecture.teacher, day, slot_idx): continue
+                if occupancy.batch_busy(lecture.batch, day, slot_idx): continue
+                free = room_mask & ~occupancy.room_mask(day, slot_idx)
+                if free:
+                    placements.append((day, slot_idx, free & suitable or free))
+        return placements
+
+    def _smallest_room(self, mask):
+        """Room of a bitmask with the least capacity"""
+        rooms = []
+        while mask:
+            rooms.append((mask & -mask).bit_length() - 1)
+            mask &= mask - 1
+        return min(rooms, key=lambda r: self.room_capacities[r])
+
+    def repair(self, timetable, movable, pinned=(), room_mask=None):
+        """Re-place the lectures at the indexes in movable; returns the timetable and the indexes left unplaced"""
+        room_mask = self.all_rooms_mask if room_mask is None else room_mask
+        timetable = list(timetable)
+        movable, pinned = set(movable), set(pinned)
+        occupancy = self._new_occupancy()
+        scorer = DissonanceScorer((), self.num_days, len(self.batch_ids))
+        cells = defaultdict(set)  # day * slots_per_day + slot -> indexes of the lectures placed there
+
+        def place(i, lecture):
+            timetable[i] = lecture
+            occupancy.place(lecture)
+            scorer.add(lecture)
+            cells[lecture.day * self.slots_per_day + lecture.slot].add(i)
+
+        def unplace(i):
+            lecture = timetable[i]
+            occupancy.remove(lecture)
+            scorer.remove(lecture)
+            cells[lecture.day * self.slots_per_day + lecture.slot].discard(i)
+
+        def cheapest(lecture, placements):
+            best, best_total = None, None
+            for day, slot_idx, rooms in placements:
+                candidate = lecture.placed(self._smallest_room(rooms), day, slot_idx)
+                total = scorer.add(candidate)
+                scorer.remove(candidate)
+                if best is None or total < best_total:
+                    best, best_total = candidate, total
+            return best
+
+        for i, lecture in enumerate(timetable):
+            if i not in movable:
+                place(i, lecture)
+
+        unplaced = []
+        order = sorted(movable, key=lambda i: len(self._placements(timetable[i], occupancy, room_mask)))
+        for i in order:
+            lecture = timetable[i]
+            best = cheapest(lecture, self._placements(lecture, occupancy, room_mask))
+            if best is not None:
+                place(i, best)
+                continue
+            # Eject one lecture sharing the teacher or batch from a cell the teacher can make
+            for cell in range(self.num_days * self.slots_per_day):
+                day, slot_idx = divmod(cell, self.slots_per_day)
+                if (day, slot_idx) in self.teacher_unavailable[lecture.teacher]: continue
+                blockers = [j for j in cells[cell]
+                            if timetable[j].teacher == lecture.teacher or timetable[j].batch == lecture.batch]
+                if len(blockers) != 1 or blockers[0] in pinned or blockers[0] in movable: continue
+                j = blockers[0]
+                blocker = timetable[j]
+                unplace(j)
+                here = [p for p in self._placements(lecture, occupancy, room_mask) if p[:2] == (day, slot_idx)]
+                if here:
+                    place(i, cheapest(lecture, here))
+                    moved = cheapest(blocker, self._placements(blocker, occupancy, room_mask))
+                    if moved is not None:
+                        place(j, moved)
+                        break
+                    unplace(i)
+                    timetable[i] = lecture
+                place(j, blocker)
+            else:
+                unplaced.append(i)
+        return timetable, unplaced
+
+# --- Parallel harmony search ---
+SEARCH_CHUNK_ATTEMPTS = 50  # Construction attempts per process-pool task
+# Workers start from a forkserver instead of forking this process, whose job and heartbeat threads
+# may hold locks at that moment, and live as long as the process so no request pays for starting them
+_process_context = multiprocessing.get_context('forkserver')
+_process_context.set_forkserver_preload([__name__])
+_search_pool = None
+_search_pool_size = 0
+_search_pool_lock = threading.Lock()
+
+def search_pool(workers):
+    """The process pool shared by every parallel search of this process, with at least workers processes"""
+    global _search_pool, _search_pool_size
+    with _search_pool_lock:
+        # A pool that lost a worker is broken for good. Searches still holding a replaced pool
+        # finish on it, and it shuts down once they let go of it.
+        if _search_pool is None or _search_pool._broken or _search_pool_size < workers:
+            _search_pool = ProcessPoolExecutor(max_workers=workers, mp_context=_process_context)
+            _search_pool_size = workers
+        return _search_pool
+
+def _search_chunk(scheduler, seed, attempts, target, relaxed, deadline):
+    """Process-pool task: one chunk of construction attempts with its own random seed; the
+    _search() result is followed by the metrics the chunk recorded"""
+    random.seed(seed)
+    scheduler.metrics = Metrics()
+    return scheduler._search(attempts, target, relaxed, deadline) + (scheduler.metrics.drain(),)
+
+def _island_epoch(scheduler, harmony_memory, iterations, deadline):
+    """Build an island's memory (harmony_memory None) or improvise on it for one epoch"""
+    if harmony_memory is None:
+        return scheduler._initial_memory(deadline)
+    scheduler.improvise(harmony_memory, iterations, deadline)
+    return harmony_memory
+
+def _island_task(scheduler, seed, harmony_memory, iterations, deadline):
+    """Process-pool task: one island epoch with its own random seed"""
+    random.seed(seed)
+    return _island_epoch(scheduler, harmony_memory, iterations, deadline)
+
+def run_islands(scheduler, islands=None, workers=1):
+    """Island-model harmony search over ring-migrating memories; returns the exported best harmony or None"""
+    islands = islands or scheduler.islands
+    deadline = scheduler._deadline()
+    pool = search_pool(min(workers, islands)) if workers > 1 else None
+
+    def each_island(memories, iterations):
+        if pool is None:
+            return [_island_epoch(scheduler, memory, iterations, deadline) for memory in memories]
+        futures = [pool.submit(_island_task, scheduler, random.getrandbits(32), memory, iterations, deadline)
+                   for memory in memories]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    memories = [memory for memory in each_island([None] * islands, 0) if memory]
+    if not memories:
+        return None
+    best = min((memory[0] for memory in memories), key=lambda x: x[1])
+    done, stale_iterations = 0, 0
+    while done < scheduler.iterations:
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        if scheduler.patience is not None and stale_iterations >= scheduler.patience:
+            break
+        epoch = min(scheduler.migration_interval, scheduler.iterations - done)
+        memories = each_island(memories, epoch)
+        done += epoch
+        # Ring migration; copies, because the receiving island improvises on its harmonies in place
+        migrants = [memory[0] for memory in memories]
+        for i, (harmony, dissonance) in enumerate(migrants):
+            target = memories[(i + 1) % len(memories)]
+            if (len(memories) > 1 and dissonance < target[-1][1] and
+                    scheduler._signature(harmony) not in {scheduler._signature(h) for h, _ in target}):
+                target[-1] = (list(harmony), dissonance)
+                target.sort(key=lambda x: x[1])
+        epoch_best = min(migrants, key=lambda x: x[1])
+        if epoch_best[1] < best[1]:
+            best, stale_iterations = epoch_best, 0
+        else:
+            stale_iterations += epoch
+    return scheduler.export(best[0])
+
+def search_harmonies(scheduler, max_attempts, target, relaxed=False, workers=1, on_progress=None,
+                     deadline=None, min_found=1):
+    """Up to target acceptable (harmony, dissonance) pairs from max_attempts constructions, plus stats"""
+    found = []
+    started = time.monotonic()
+    stats = {'mode': scheduler.construction_mode, 'attempts': 0, 'accepted': 0, 'time_to_first_valid': None}
+    best = {'dissonance': None, 'stale_attempts': 0}
+
+    def stop_reason():
+        if len(found) >= target:
+            return 'target'
+        if deadline is not None and time.monotonic() >= deadline:
+            return 'deadline'
+        if (scheduler.patience is not None and len(found) >= min(min_found, target) and
+                best['stale_attempts'] >= scheduler.patience):
+            return 'patience'
+        return None
+
+    def record(chunk_found, made, first_valid_at):
+        found.extend(chunk_found)
+        stats['attempts'] += made
+        stats['accepted'] += len(chunk_found)
+        chunk_best = min((score for _, score in chunk_found), default=None)
+        if chunk_best is not None and (best['dissonance'] is None or chunk_best < best['dissonance']):
+            best['dissonance'], best['stale_attempts'] = chunk_best, 0
+        else:
+            best['stale_attempts'] += made
+        if first_valid_at is not None:
+            elapsed = round(first_valid_at - started, 4)
+            if stats['time_to_first_valid'] is None or elapsed < stats['time_to_first_valid']:
+                stats['time_to_first_valid'] = elapsed
+        if on_progress:
+            on_progress(made, chunk_found)
+
+    def collect(future):
+        *result, chunk_metrics = future.result()
+        scheduler.metrics.merge(chunk_metrics)
+        record(*result)
+
+    if workers <= 1:
+        while stats['attempts'] < max_attempts and not stop_reason():
+            record(*scheduler._search(min(SEARCH_CHUNK_ATTEMPTS, max_attempts - stats['attempts']),
+                                      target - len(found), relaxed, deadline))
+        stats['stopped'] = stop_reason() or 'attempts'
+    else:
+        # One chunk per worker at a time, each looking for its share of the harmonies still
+        # missing, and no more chunks in flight than are needed to cover the rest
+        submitted = 0
+        pending = {}  # future -> harmonies that chunk looks for
+        pool = search_pool(workers)
+        try:
+            while not stop_reason():
+                remaining = target - len(found)
+                share = math.ceil(remaining / workers)
+                while len(pending) < workers and submitted < max_attempts and sum(pending.values()) < remaining:
+                    chunk = min(SEARCH_CHUNK_ATTEMPTS, max_attempts - submitted)
+                    chunk_target = min(share, remaining - sum(pending.values()))
+                    pending[pool.submit(_search_chunk, scheduler, random.getrandbits(32), chunk, chunk_target,
+                                        relaxed, deadline)] = chunk_target
+                    submitted += chunk
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    collect(future)
+            stats['stopped'] = stop_reason() or 'attempts'
+            # Chunks that already started run to the end regardless; count their attempts and keep their harmonies
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                if not future.cancelled():
+                    collect(future)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    stats['acceptance_rate'] = round(stats['accepted'] / stats['attempts'], 4) if stats['attempts'] else 0.0
+    stats['seconds'] = round(time.monotonic() - started, 4)
+    return found[:target], stats
+
+def _solve_subproblem(scheduler, seed, max_attempts, target, deadline, min_found):
+    """Process-pool task: search_harmonies() for one subproblem, plus the metrics it recorded"""
+    random.seed(seed)
+    scheduler.metrics = Metrics()
+    found, stats = search_harmonies(scheduler, max_attempts, target, deadline=deadline, min_found=min_found)
+    return found, stats, scheduler.metrics.drain()
+
+def solve_subproblems(scheduler, subproblems, max_attempts, target, workers=1, on_progress=None,
+                      deadline=None, min_found=1):
+    """search_harmonies() per subproblem, merging their k-th best harmonies; returns the merged pairs and stats"""
+    started = time.monotonic()
+    skipped = {'attempts': 0, 'accepted': 0, 'time_to_first_valid': None, 'stopped': 'skipped'}
+    results = [([], skipped)] * len(subproblems)
+    if workers > 1:
+        pool = search_pool(min(workers, len(subproblems)))
+        queued = list(enumerate(subproblems))
+        pending = {}  # future -> index of its subproblem, at most workers at a time
+        try:
+            exhausted = False  # a subproblem came back empty
+            while (queued or pending) and not exhausted:
+                while queued and len(pending) < workers:
+                    i, sub = queued.pop(0)
+                    pending[pool.submit(_solve_subproblem, sub, random.getrandbits(32), max_attempts, target,
+                                        deadline, min_found)] = i
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found, stats, sub_metrics = future.result()
+                    scheduler.metrics.merge(sub_metrics)
+                    results[pending.pop(future)] = (found, stats)
+                    if on_progress:
+                        on_progress(stats['attempts'], [])
+                    exhausted = exhausted or not found
+        finally:
+            for future in pending:
+                future.cancel()
+    else:
+        progress = (lambda made, found: on_progress(made, [])) if on_progress else None
+        for i, sub in enumerate(subproblems):
+            results[i] = search_harmonies(sub, max_attempts, target, on_progress=progress,
+                                          deadline=deadline, min_found=min_found)
+            scheduler.metrics.merge(sub.metrics)
+            if not results[i][0]:
+                break
+
+    ranked = [sorted(found, key=lambda x: x[1]) for found, _ in results]
+    merged = []
+    with scheduler.metrics.timer('merge'):
+        for k in range(min(len(found) for found in ranked)):
+            harmony = scheduler.compile_timetable(
+                [slot for sub, found in zip(subproblems, ranked) for slot in sub.export(found[k][0])])
+            if harmony is not None and scheduler._is_acceptable(harmony):
+                merged.append(harmony)
+            else:
+                scheduler.metrics.inc('harmonies_rejected', reason='merge')
+        merged = list(zip(merged, scheduler._evaluate_batch(merged)))
+    if on_progress:
+        on_progress(0, merged)
+
+    sub_stats = [dict(stats, lectures=len(sub.lecture_pool)) for sub, (_, stats) in zip(subproblems, results)]
+    first_valid = [stats['time_to_first_valid'] for stats in sub_stats]
+    attempts = sum(stats['attempts'] for stats in sub_stats)
+    return merged, {
+        'mode': scheduler.construction_mode,
+        'attempts': attempts,
+        'accepted': len(merged),
+        'time_to_first_valid': None if None in first_valid else max(first_valid),
+        'stopped': 'target' if len(merged) >= target else 'subproblems',
+        'acceptance_rate': round(len(merged) / attempts, 4) if attempts else 0.0,
+        'seconds': round(time.monotonic() - started, 4),
+        'subproblems': sub_stats
+    }
+
+# List-valued attributes live in association tables; the JSON columns are kept as a mirror
+def _grouped(rows):
+    """{key: [values...]} from (key, value) rows"""
+    groups = defaultdict(list)
+    for key, value in rows:
+        groups[key].append(value)
+    return groups
+
+def set_faculty_relations(faculty_id, subjects, unavailable):
+    FacultySubject.query.filter_by(faculty_id=faculty_id).delete()
+    FacultyUnavailability.query.filter_by(faculty_id=faculty_id).delete()
+    db.session.add_all(FacultySubject(faculty_id=faculty_id, subject=str(subject), position=i)
+                       for i, subject in enumerate(dict.fromkeys(subjects)))
+    db.session.add_all(FacultyUnavailability(faculty_id=faculty_id, day=day, slot_index=slot_index, position=i)
+                       for i, (day, slot_index) in enumerate(dict.fromkeys(filter(None, map(parse_slot_ref, unavailable)))))
+
+def set_subject_relations(subject_id, batches, fixed_slots):
+    SubjectBatch.query.filter_by(subject_id=subject_id).delete()
+    SubjectFixedSlot.query.filter_by(subject_id=subject_id).delete()
+    db.session.add_all(SubjectBatch(subject_id=subject_id, batch_id=str(batch_id), position=i)
+                       for i, batch_id in enumerate(dict.fromkeys(batches)))
+    for i, fixed in enumerate(fixed_slots):
+        ref = parse_slot_ref(fixed)
+        if ref:
+            db.session.add(SubjectFixedSlot(subject_id=subject_id, day=ref[0], slot_index=ref[1], position=i,
+                                            room_id=fixed.get('room_id') if isinstance(fixed, dict) else None))
+
+def set_batch_relations(batch_id, electives):
+    BatchElective.query.filter_by(batch_id=batch_id).delete()
+    db.session.add_all(BatchElective(batch_id=batch_id, subject=str(subject), position=i)
+                       for i, subject in enumerate(dict.fromkeys(electives)))
+
+def _owned_by(query, column, ids):
+    return query if ids is None else query.filter(column.in_(ids))
+
+def faculty_relations(ids=None):
+    """Subjects and unavailable slots ("Mon-2") of every faculty member, or of those in ids, keyed by faculty id"""
+    subjects = _grouped(_owned_by(db.session.query(FacultySubject.faculty_id, FacultySubject.subject),
+                                  FacultySubject.faculty_id, ids)
+                        .order_by(FacultySubject.faculty_id, FacultySubject.position))
+    unavailable = _grouped((f, f'{day}-{slot_index}') for f, day, slot_index in _owned_by(db.session.query(
+        FacultyUnavailability.faculty_id, FacultyUnavailability.day, FacultyUnavailability.slot_index),
+        FacultyUnavailability.faculty_id, ids).order_by(FacultyUnavailability.faculty_id, FacultyUnavailability.position))
+    return subjects, unavailable
+
+def subject_relations(ids=None):
+    """Batch ids and fixed slots of every subject, or of those in ids, keyed by subject id"""
+    batches = _grouped(_owned_by(db.session.query(SubjectBatch.subject_id, SubjectBatch.batch_id),
+                                 SubjectBatch.subject_id, ids)
+                       .order_by(SubjectBatch.subject_id, SubjectBatch.position))
+    fixed_slots = _grouped((f.subject_id, {'day': f.day, 'slot_index': f.slot_index, 'room_id': f.room_id})
+                           for f in _owned_by(SubjectFixedSlot.query, SubjectFixedSlot.subject_id, ids)
+                           .order_by(SubjectFixedSlot.subject_id, SubjectFixedSlot.position))
+    return batches, fixed_slots
+
+def batch_relations(ids=None):
+    """Electives of every batch, or of those in ids, keyed by batch id"""
+    electives = _grouped(_owned_by(db.session.query(BatchElective.batch_id, BatchElective.subject),
+                                   BatchElective.batch_id, ids)
+                         .order_by(BatchElective.batch_id, BatchElective.position))
+    return (electives,)
 
 # Database initialization
 def create_tables():
-    """Create all database tables"""
+    """Create all database tables and apply pending schema migrations"""
     with app.app_context():
-        db.create_all()
+        migrate(db.engine, db.metadata)
         print("Database tables created successfully!")
 
 def initialize_sample_data():
@@ -309,6 +1321,7 @@ def initialize_sample_data():
             for f_data in faculty_data:
                 faculty = Faculty(**f_data)
                 db.session.add(faculty)
+                set_faculty_relations(faculty.id, json.loads(faculty.subjects), json.loads(faculty.unavailable_slots))
 
         if Subject.query.count() == 0:
             import json
@@ -320,6 +1333,7 @@ def initialize_sample_data():
             for s_data in subjects_data:
                 subject = Subject(**s_data)
                 db.session.add(subject)
+                set_subject_relations(subject.id, json.loads(subject.batches), json.loads(subject.fixed_slots))
 
         if Batch.query.count() == 0:
             import json
@@ -330,6 +1344,7 @@ def initialize_sample_data():
             for b_data in batches_data:
                 batch = Batch(**b_data)
                 db.session.add(batch)
+                set_batch_relations(batch.id, json.loads(batch.electives))
 
         if Shift.query.count() == 0:
             shifts_data = [
@@ -438,17 +1453,88 @@ def logout():
     return redirect(url_for('login'))
 
 # GET endpoints for frontend data fetching
-@app.route('/api/classrooms', methods=['GET'])
-def get_classrooms():
-    classrooms = Classroom.query.all()
-    return jsonify([{
+# Master data listings are served from an in-process cache of their serialized JSON, keyed on a
+# per-table version kept in the database. Write handlers bump it in the transaction of the write,
+# so every worker process sees the change on its next request. The ETag is the table and the
+# version, so a client revalidating an unchanged listing gets a 304 after one primary-key lookup.
+_listing_cache = {}  # table -> (version, serialized body)
+
+def bump_version(*tables):
+    """Bump the versions of tables in the current transaction; call before committing the write"""
+    upsert = sqlite_insert(TableVersion).values([{'name': table, 'version': 1} for table in tables])
+    db.session.execute(upsert.on_conflict_do_update(index_elements=['name'],
+                                                    set_={'version': TableVersion.version + 1}))
+
+def table_version(table):
+    return db.session.query(TableVersion.version).filter(TableVersion.name == table).scalar() or 0
+
+def cached_listing(table, build):
+    """Response with the JSON of build() for a master-data table, or 304 if the client has it"""
+    version = table_version(table)
+    etag = f'{table}-{version}'
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        cached = _listing_cache.get(table)
+        if cached is None or cached[0] != version:
+            cached = (version, app.json.dumps(build()))
+            _listing_cache[table] = cached
+        response = app.response_class(cached[1], mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate
+    return response
+
+# Records as served by the listings and exports; the relation arguments are the grouped dicts
+# returned by faculty_relations(), subject_relations() and batch_relations()
+def classroom_record(c):
+    return {
         'id': c.id,
         'name': c.name,
         'capacity': c.capacity,
         'room_type': c.room_type,
         'department': c.department,
         'is_available': c.is_available
-    } for c in classrooms]), 200
+    }
+
+def faculty_record(f, subjects, unavailable):
+    return {
+        'id': f.id,
+        'name': f.name,
+        'subjects': subjects[f.id],
+        'leaves_per_month': f.leaves_per_month,
+        'unavailable': unavailable[f.id],
+        'department': f.department,
+        'email': f.email
+    }
+
+def subject_record(s, batches, fixed_slots):
+    return {
+        'id': s.id,
+        'name': s.name,
+        'teacher': s.teacher_id,
+        'batches': batches[s.id],
+        'per_week': s.per_week,
+        'needs_lab': s.needs_lab,
+        'fixed_slots': fixed_slots[s.id],
+        'department': s.department,
+        'credits': s.credits
+    }
+
+def batch_record(b, electives):
+    return {
+        'id': b.id,
+        'name': b.name,
+        'size': b.size,
+        'department': b.department,
+        'shift': b.shift,
+        'electives': electives[b.id]
+    }
+
+@app.route('/api/classrooms', methods=['GET'])
+def get_classrooms():
+    def build():
+        return [classroom_record(c) for c in Classroom.query.all()]
+    return cached_listing('classroom', build)
 
 @app.route('/api/classrooms', methods=['POST'])
 def add_classroom():
@@ -461,6 +1547,7 @@ def add_classroom():
         department=data.get('department')
     )
     db.session.add(classroom)
+    bump_version('classroom')
     db.session.commit()
     return jsonify({'message': 'Classroom added'}), 200
 
@@ -472,22 +1559,16 @@ def update_classroom(classroom_id):
     classroom.capacity = data['capacity']
     classroom.room_type = data.get('room_type', classroom.room_type)
     classroom.department = data.get('department', classroom.department)
+    bump_version('classroom')
     db.session.commit()
     return jsonify({'message': 'Classroom updated'}), 200
 
 @app.route('/api/faculty', methods=['GET'])
 def get_faculty():
-    faculty = Faculty.query.all()
-    import json
-    return jsonify([{
-        'id': f.id,
-        'name': f.name,
-        'subjects': json.loads(f.subjects),
-        'leaves_per_month': f.leaves_per_month,
-        'unavailable': json.loads(f.unavailable_slots) if f.unavailable_slots else [],
-        'department': f.department,
-        'email': f.email
-    } for f in faculty]), 200
+    def build():
+        subjects, unavailable = faculty_relations()
+        return [faculty_record(f, subjects, unavailable) for f in Faculty.query.all()]
+    return cached_listing('faculty', build)
 
 @app.route('/api/faculty', methods=['POST'])
 def add_faculty():
@@ -503,6 +1584,8 @@ def add_faculty():
         email=data.get('email')
     )
     db.session.add(faculty)
+    set_faculty_relations(faculty.id, data['subjects'], data.get('unavailable', []))
+    bump_version('faculty')
     db.session.commit()
     return jsonify({'message': 'Faculty added'}), 200
 
@@ -517,24 +1600,17 @@ def update_faculty(faculty_id):
     faculty_member.unavailable_slots = json.dumps(data.get('unavailable', []))
     faculty_member.department = data.get('department', faculty_member.department)
     faculty_member.email = data.get('email', faculty_member.email)
+    set_faculty_relations(faculty_id, data['subjects'], data.get('unavailable', []))
+    bump_version('faculty')
     db.session.commit()
     return jsonify({'message': 'Faculty updated'}), 200
 
 @app.route('/api/subjects', methods=['GET'])
 def get_subjects():
-    subjects = Subject.query.all()
-    import json
-    return jsonify([{
-        'id': s.id,
-        'name': s.name,
-        'teacher': s.teacher_id,
-        'batches': json.loads(s.batches),
-        'per_week': s.per_week,
-        'needs_lab': s.needs_lab,
-        'fixed_slots': json.loads(s.fixed_slots) if s.fixed_slots else [],
-        'department': s.department,
-        'credits': s.credits
-    } for s in subjects]), 200
+    def build():
+        batches, fixed_slots = subject_relations()
+        return [subject_record(s, batches, fixed_slots) for s in Subject.query.all()]
+    return cached_listing('subject', build)
 
 @app.route('/api/subjects', methods=['POST'])
 def add_subject():
@@ -552,6 +1628,8 @@ def add_subject():
         credits=data.get('credits', 1)
     )
     db.session.add(subject)
+    set_subject_relations(subject.id, data['batches'], data.get('fixed_slots', []))
+    bump_version('subject')
     db.session.commit()
     return jsonify({'message': 'Subject added'}), 200
 
@@ -571,22 +1649,18 @@ def update_subject(subject_id):
     subject.fixed_slots = json.dumps(data.get('fixed_slots', []))
     subject.department = data.get('department')
     subject.credits = data.get('credits', 1)
+    set_subject_relations(subject_id, data['batches'], data.get('fixed_slots', []))
     
+    bump_version('subject')
     db.session.commit()
     return jsonify({'message': 'Subject updated'}), 200
 
 @app.route('/api/batches', methods=['GET'])
 def get_batches():
-    batches = Batch.query.all()
-    import json
-    return jsonify([{
-        'id': b.id,
-        'name': b.name,
-        'size': b.size,
-        'department': b.department,
-        'shift': b.shift,
-        'electives': json.loads(b.electives) if b.electives else []
-    } for b in batches]), 200
+    def build():
+        electives, = batch_relations()
+        return [batch_record(b, electives) for b in Batch.query.all()]
+    return cached_listing('batch', build)
 
 @app.route('/api/batches', methods=['POST'])
 def add_batch():
@@ -601,6 +1675,8 @@ def add_batch():
         electives=json.dumps(data.get('electives', []))
     )
     db.session.add(batch)
+    set_batch_relations(batch.id, data.get('electives', []))
+    bump_version('batch')
     db.session.commit()
     return jsonify({'message': 'Batch added'}), 200
 
@@ -617,139 +1693,890 @@ def update_batch(batch_id):
     batch.department = data.get('department')
     batch.shift = data.get('shift', 'morning')
     batch.electives = json.dumps(data.get('electives', []))
+    set_batch_relations(batch_id, data.get('electives', []))
     
+    bump_version('batch')
     db.session.commit()
     return jsonify({'message': 'Batch updated'}), 200
 
-# Data generation endpoint (database)
-@app.route('/api/generate', methods=['POST'])
-def generate():
+# Bulk import/export of master data
+# Imports read CSV or JSON lines from the request body (or a multipart "file") as a stream and
+# upsert them BULK_CHUNK_ROWS at a time, one transaction per chunk, so an upload is never held in
+# memory as a whole. A row replaces the whole record with that id, relations included; invalid
+# rows are reported by line and skipped. In CSV, list fields are JSON arrays or ";"-separated
+# values, and fixed_slots must be JSON. Exports stream the table in the same format through a
+# yield_per cursor, loading relations one chunk of ids at a time.
+MAX_REPORTED_IMPORT_ERRORS = 100
+
+def _field(item, name, default=None):
+    value = item.get(name)
+    return default if value is None or value == '' else value
+
+def _required_text(item, name):
+    value = _field(item, name)
+    if value is None:
+        raise ValueError(f'{name} is required')
+    return str(value)
+
+def _int_field(item, name, default=None):
+    value = _field(item, name, default)
+    if value is None:
+        raise ValueError(f'{name} is required')
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'{name} must be an integer')
     try:
-        data = request.get_json()
-        required_keys = ['config', 'rooms', 'teachers', 'batches', 'subjects']
-        for key in required_keys:
-            if key not in data:
-                return jsonify({"error": f"Missing key: {key}"}), 400
-
-        # Validate data structure
-        if not isinstance(data['rooms'], list) or not isinstance(data['teachers'], list) or not isinstance(data['batches'], list) or not isinstance(data['subjects'], list):
-            return jsonify({"error": "Invalid data format. All data must be arrays."}), 400
-
-        # Convert lists to dicts for lookup
-        teachers = {t['id']: t for t in data['teachers']}
-        batches = {b['id']: b for b in data['batches']}
-        rooms = data['rooms']
-        subjects = data['subjects']
-        config = data['config']
-        num_timetables = max(config.get('NUM_TIMETABLES', 3), 3)  # At least 3 timetables
-
-        scheduler = TemporalHarmonyScheduler(config, rooms, teachers, batches, subjects)
-        harmony_memory = []
-
-        # Generate more harmony solutions with increased attempts for complete slot filling
-        max_attempts = max(scheduler.hms * 300, 8000)  # Greatly increased attempts
-        successful_generations = 0
-
-        for attempt in range(max_attempts):
-            if len(harmony_memory) >= scheduler.hms:
-                break
-            new_harmony = scheduler._generate_random_valid_timetable()
-            if new_harmony:
-                # Check for clashes and basic validity
-                if not has_clashes(new_harmony) and len(new_harmony) > 0:
-                    # Additional check: ensure all days have some classes and good slot utilization
-                    days_with_classes = set(slot['day'] for slot in new_harmony)
-                    total_slots = len(config['DAYS_OF_WEEK']) * config['SLOTS_PER_DAY']
-                    slot_utilization = len(new_harmony) / total_slots
-
-                    if (len(days_with_classes) >= len(config['DAYS_OF_WEEK']) and  # Use ALL days
-                        slot_utilization >= 0.85):  # At least 85% of slots filled
-                        harmony_memory.append((new_harmony, scheduler._calculate_dissonance(new_harmony)))
-                        successful_generations += 1
-
-        # If we still don't have enough timetables, try with more relaxed constraints
-        if len(harmony_memory) < 3:
-            print(f"Warning: Only generated {len(harmony_memory)} valid timetables. Using relaxed constraints...")
-            for attempt in range(max_attempts // 10):
-                if len(harmony_memory) >= 3:
-                    break
-                new_harmony = scheduler._generate_random_valid_timetable()
-                if new_harmony and len(new_harmony) > 0:
-                    # Accept even with fewer requirements
-                    days_with_classes = set(slot['day'] for slot in new_harmony)
-                    if len(days_with_classes) >= len(config['DAYS_OF_WEEK']) * 0.8:  # At least 80% of days
-                        harmony_memory.append((new_harmony, scheduler._calculate_dissonance(new_harmony)))
-
-        if not harmony_memory:
-            return jsonify({"error": "Failed to generate timetables. The algorithm couldn't find valid schedules that fill the time slots properly. Try:\n• Adding more classrooms\n• Adding more faculty\n• Reducing classes per week for subjects\n• Increasing slots per day\n• Adding more days per week"}), 500
-
-        harmony_memory.sort(key=lambda x: x[1])
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+
+def _bool_field(item, name, default):
+    value = _field(item, name, default)
+    if isinstance(value, str):
+        if value.strip().lower() in ('1', 'true', 'yes', 'y'):
+            return True
+        if value.strip().lower() in ('0', 'false', 'no', 'n'):
+            return False
+    elif isinstance(value, (bool, int)):
+        return bool(value)
+    raise ValueError(f'{name} must be true or false')
+
+def _list_field(item, name):
+    value = _field(item, name, [])
+    if isinstance(value, str):
+        if value.lstrip().startswith('['):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise ValueError(f'{name} is not valid JSON')
+        else:
+            return [part.strip() for part in value.split(';') if part.strip()]
+    if not isinstance(value, list):
+        raise ValueError(f'{name} must be a list')
+    return value
+
+def _slot_refs(item, name):
+    values = _list_field(item, name)
+    refs = [parse_slot_ref(value) for value in values]
+    if None in refs:
+        raise ValueError(f'{name} has an entry that is not a day and slot index')
+    return values, refs
+
+# Each import_* turns one uploaded row into (record, {association model: rows})
+def import_classroom(item):
+    classroom_id = _required_text(item, 'id')
+    return {
+        'id': classroom_id,
+        'name': str(_field(item, 'name', classroom_id)),
+        'capacity': _int_field(item, 'capacity'),
+        'room_type': str(_field(item, 'room_type', 'Lecture')),
+        'department': _field(item, 'department'),
+        'is_available': _bool_field(item, 'is_available', True)
+    }, {}
+
+def import_faculty(item):
+    faculty_id = _required_text(item, 'id')
+    subjects = list(dict.fromkeys(map(str, _list_field(item, 'subjects'))))
+    unavailable, refs = _slot_refs(item, 'unavailable')
+    return {
+        'id': faculty_id,
+        'name': _required_text(item, 'name'),
+        'subjects': json.dumps(subjects),
+        'leaves_per_month': _int_field(item, 'leaves_per_month', 1),
+        'unavailable_slots': json.dumps(unavailable),
+        'department': _field(item, 'department'),
+        'email': _field(item, 'email')
+    }, {
+        FacultySubject: [{'faculty_id': faculty_id, 'subject': subject, 'position': i}
+                         for i, subject in enumerate(subjects)],
+        FacultyUnavailability: [{'faculty_id': faculty_id, 'day': day, 'slot_index': slot_index, 'position': i}
+                                for i, (day, slot_index) in enumerate(dict.fromkeys(refs))]
+    }
+
+def import_subject(item):
+    subject_id = _required_text(item, 'id')
+    batches = list(dict.fromkeys(map(str, _list_field(item, 'batches'))))
+    fixed_slots, refs = _slot_refs(item, 'fixed_slots')
+    return {
+        'id': subject_id,
+        'name': _required_text(item, 'name'),
+        'teacher_id': _required_text(item, 'teacher'),
+        'batches': json.dumps(batches),
+        'per_week': _int_field(item, 'per_week'),
+        'needs_lab': _bool_field(item, 'needs_lab', False),
+        'fixed_slots': json.dumps(fixed_slots),
+        'department': _field(item, 'department'),
+        'credits': _int_field(item, 'credits', 1)
+    }, {
+        SubjectBatch: [{'subject_id': subject_id, 'batch_id': batch_id, 'position': i}
+                       for i, batch_id in enumerate(batches)],
+        SubjectFixedSlot: [{'subject_id': subject_id, 'day': day, 'slot_index': slot_index, 'position': i,
+                            'room_id': fixed.get('room_id') if isinstance(fixed, dict) else None}
+                           for i, (fixed, (day, slot_index)) in enumerate(zip(fixed_slots, refs))]
+    }
+
+def import_batch(item):
+    batch_id = _required_text(item, 'id')
+    electives = list(dict.fromkeys(map(str, _list_field(item, 'electives'))))
+    return {
+        'id': batch_id,
+        'name': _required_text(item, 'name'),
+        'size': _int_field(item, 'size'),
+        'department': _field(item, 'department'),
+        'shift': str(_field(item, 'shift', 'morning')),
+        'electives': json.dumps(electives)
+    }, {
+        BatchElective: [{'batch_id': batch_id, 'subject': subject, 'position': i}
+                        for i, subject in enumerate(electives)]
+    }
+
+# URL name -> model, listing version table, row importer, relation loader, record serializer and
+# the association tables (with their owner column) an import replaces
+BULK_TABLES = {
+    'classrooms': (Classroom, 'classroom', import_classroom, lambda ids: (), classroom_record, ()),
+    'faculty': (Faculty, 'faculty', import_faculty, faculty_relations, faculty_record,
+                ((FacultySubject, FacultySubject.faculty_id), (FacultyUnavailability, FacultyUnavailability.faculty_id))),
+    'subjects': (Subject, 'subject', import_subject, subject_relations, subject_record,
+                 ((SubjectBatch, SubjectBatch.subject_id), (SubjectFixedSlot, SubjectFixedSlot.subject_id))),
+    'batches': (Batch, 'batch', import_batch, batch_relations, batch_record,
+                ((BatchElective, BatchElective.batch_id),)),
+}
+
+def _bulk_format(default_name=''):
+    requested = (request.args.get('format') or '').lower()
+    if requested:
+        return requested
+    if 'csv' in (request.mimetype or '') or default_name.lower().endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+def _upload_rows(stream, fmt):
+    """(line number, row dict or None, error) for each row of a CSV or JSON lines byte stream"""
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(text_stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'invalid JSON'
+            continue
+        if isinstance(row, dict):
+            yield line_number, row, None
+        else:
+            yield line_number, None, 'expected a JSON object'
+
+def _upsert_chunk(model, associations, records, relations):
+    columns = [name for name in records[0] if name != 'id']
+    upsert = sqlite_insert(model)
+    upsert = upsert.on_conflict_do_update(index_elements=['id'],
+                                          set_={name: upsert.excluded[name] for name in columns})
+    db.session.execute(upsert, records)
+    ids = [record['id'] for record in records]
+    for association, owner_column in associations:
+        db.session.execute(association.__table__.delete().where(owner_column.in_(ids)))
+        if relations[association]:
+            db.session.execute(insert(association), relations[association])
+
+@app.route('/api/<any(classrooms, faculty, subjects, batches):table>/import', methods=['POST'])
+def bulk_import(table):
+    model, version_table, import_row, _, _, associations = BULK_TABLES[table]
+    # Only a multipart upload is parsed as a form; anything else (curl --data-binary sends
+    # application/x-www-form-urlencoded) is read from the raw body
+    upload = None
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': 'multipart uploads need a "file" part'}), 400
+    fmt = _bulk_format(upload.filename or '' if upload else '')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    chunk_rows = max(1, app.config['BULK_CHUNK_ROWS'])
+    summary = {'imported': 0, 'failed': 0, 'chunks': 0, 'errors': []}
+
+    def report(line, error):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_IMPORT_ERRORS:
+            summary['errors'].append({'line': line, 'error': error})
+
+    chunk = {}  # id -> (line, record, relations); a later row for the same id wins
+
+    def flush():
+        if not chunk:
+            return
+        records = [record for _, record, _ in chunk.values()]
+        relations = defaultdict(list)
+        for _, _, row_relations in chunk.values():
+            for association, rows in row_relations.items():
+                relations[association].extend(rows)
+        try:
+            _upsert_chunk(model, associations, records, relations)
+            bump_version(version_table)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for line, _, _ in chunk.values():
+                report(line, f'not saved: {e.__class__.__name__}')
+        else:
+            summary['imported'] += len(records)
+            summary['chunks'] += 1
+        chunk.clear()
+
+    for line, row, error in _upload_rows(upload.stream if upload else request.stream, fmt):
+        if error is None:
+            try:
+                record, relations = import_row(row)
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            report(line, error)
+            continue
+        chunk.pop(record['id'], None)
+        chunk[record['id']] = (line, record, relations)
+        if len(chunk) >= chunk_rows:
+            flush()
+    flush()
+    if not summary['imported'] and not summary['failed']:
+        return jsonify(dict(summary, error='no rows in the upload')), 400
+    return jsonify(summary), 200
+
+@app.route('/api/<any(classrooms, faculty, subjects, batches):table>/export', methods=['GET'])
+def bulk_export(table):
+    model, _, _, load_relations, serialize, _ = BULK_TABLES[table]
+    fmt = _bulk_format()
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+
+    def generate():
+        result = db.session.execute(db.select(*model.__table__.columns).order_by(model.id)
+                                    .execution_options(yield_per=app.config['BULK_CHUNK_ROWS']))
+        header = None
+        for rows in result.partitions():
+            relations = load_relations([row.id for row in rows])
+            records = [serialize(row, *relations) for row in rows]
+            if fmt == 'jsonl':
+                yield ''.join(json.dumps(record) + '\n' for record in records)
+                continue
+            out = io.StringIO()
+            writer = csv.writer(out)
+            if header is None:
+                header = list(records[0])
+                writer.writerow(header)
+            for record in records:
+                writer.writerow(json.dumps(record[name]) if isinstance(record[name], list) else record[name]
+                                for name in header)
+            yield out.getvalue()
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = app.response_class(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={table}.{fmt}'
+    return response
+
+# Data generation (database)
+def validate_generation_payload(data):
+    """Return an error message for a malformed generate payload, or None"""
+    if not isinstance(data, dict):
+        return "Invalid data format. Expected a JSON object."
+    required_keys = ['config', 'rooms', 'teachers', 'batches', 'subjects']
+    for key in required_keys:
+        if key not in data:
+            return f"Missing key: {key}"
+
+    # Validate data structure
+    if not isinstance(data['rooms'], list) or not isinstance(data['teachers'], list) or not isinstance(data['batches'], list) or not isinstance(data['subjects'], list):
+        return "Invalid data format. All data must be arrays."
+    return None
+
+# Generation result cache
+ALGORITHM_VERSION = 1  # Bump when a scheduler change makes cached harmonies stale
+SEARCH_CONFIG_KEYS = {'HARMONY_MEMORY_SIZE', 'MEMORY_CONSIDERATION_RATE', 'PITCH_ADJUSTMENT_RATE', 'NUM_GENERATIONS',
+                      'NUM_TIMETABLES', 'CONSTRUCTION_MODE', 'TIME_BUDGET_SECONDS', 'PATIENCE', 'ISLANDS', 'MIGRATION_INTERVAL',
+                      'USE_CACHE', 'DECOMPOSE'}  # config keys that tune the search rather than define the problem
+
+def _payload_hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+def generation_cache_keys(data):
+    """(key, problem_key) of a generate payload. key covers the whole normalized payload, seed
+    included, and the algorithm version; problem_key leaves out the search tuning so requests
+    that differ only in those settings can warm-start from each other."""
+    entities = {name: sorted(data[name], key=lambda item: str(item.get('id')) if isinstance(item, dict) else str(item))
+                for name in ('rooms', 'teachers', 'batches', 'subjects')}
+    problem_config = {k: v for k, v in data['config'].items() if k not in SEARCH_CONFIG_KEYS}
+    problem_key = _payload_hash(dict(entities, config=problem_config))
+    key = _payload_hash(dict(entities, config=data['config'], algorithm=ALGORITHM_VERSION))
+    return key, problem_key
+
+def cache_lookup(key, problem_key):
+    """Harmonies stored for key, or None, and the harmonies of the most recently used entry for the
+    same problem as a warm start"""
+    entry = db.session.get(GenerationCache, key)
+    if entry is None:
+        entry = (GenerationCache.query.filter_by(problem_key=problem_key)
+                 .order_by(GenerationCache.last_used_at.desc()).first())
+        return None, json.loads(entry.harmonies) if entry else []
+    db.session.execute(update(GenerationCache).where(GenerationCache.key == key)
+                       .values(hits=GenerationCache.hits + 1, last_used_at=datetime.utcnow()))
+    db.session.commit()
+    return json.loads(entry.harmonies), []
+
+def cache_store(key, problem_key, harmonies):
+    """Store the (slots, dissonance) pairs of a generation and evict least recently used entries
+    beyond GENERATION_CACHE_ENTRIES entries or GENERATION_CACHE_BYTES of harmonies"""
+    max_entries, max_bytes = app.config['GENERATION_CACHE_ENTRIES'], app.config['GENERATION_CACHE_BYTES']
+    payload = json.dumps(harmonies, separators=(',', ':'))
+    if not max_entries or len(payload) > max_bytes:
+        return
+    now = datetime.utcnow()
+    db.session.execute(sqlite_insert(GenerationCache).values(
+        key=key, problem_key=problem_key, harmonies=payload, size=len(payload), hits=0,
+        created_at=now, last_used_at=now).on_conflict_do_update(
+        index_elements=['key'], set_={'harmonies': payload, 'size': len(payload), 'last_used_at': now}))
+    entries = db.session.execute(db.select(GenerationCache.key, GenerationCache.size)
+                                 .order_by(GenerationCache.last_used_at.desc())).all()
+    total, evict = 0, []
+    for i, (entry_key, size) in enumerate(entries):
+        total += size
+        if i >= max_entries or total > max_bytes:
+            evict.append(entry_key)
+    if evict:
+        db.session.execute(db.delete(GenerationCache).where(GenerationCache.key.in_(evict)))
+    db.session.commit()
 
-        # Double-check generated timetables for conflicts
+CONFLICTING_OPTIONS_ERROR = {"error": "Generated timetables contain conflicts. This may be due to insufficient resources or overly restrictive constraints. Try:\n• Adding more classrooms\n• Adding more faculty\n• Reducing classes per subject\n• Increasing time slots per day\n• Reducing the number of days per week"}
+
+def find_options(scheduler, data, on_progress=None):
+    """Search for the timetable options of a validated generate payload. Returns (options,
+    construction, error): a generator of up to NUM_TIMETABLES clash-free (slots, score) pairs,
+    best first, the search statistics, and an error response body when nothing was found"""
+    config = data['config']
+    num_timetables = max(config.get('NUM_TIMETABLES', 3), 3)  # At least 3 timetables
+    workers = app.config['GENERATION_WORKERS']
+
+    # Identical requests are answered from the cache; requests for the same problem with
+    # different search settings start from the cached harmonies that are still acceptable
+    use_cache = config.get('USE_CACHE', True) and app.config['GENERATION_CACHE_ENTRIES'] > 0
+    cached, warm = None, []
+    if use_cache:
+        cache_key, problem_key = generation_cache_keys(data)
+        with scheduler.metrics.timer('cache_lookup'):
+            cached, warm = cache_lookup(cache_key, problem_key)
+        scheduler.metrics.inc('generation_cache', result='miss' if cached is None else 'hit')
+    seeded = []
+    for slots, _ in warm[:scheduler.hms]:
+        harmony = scheduler.compile_timetable(slots)
+        if harmony and scheduler._is_acceptable(harmony):
+            seeded.append(harmony)
+    seeded = list(zip(seeded, scheduler._evaluate_batch(seeded)))
+
+    if cached is not None:
+        return iter(cached[:num_timetables]), {'cache': 'hit'}, None
+
+    # Generate more harmony solutions with increased attempts for complete slot filling
+    max_attempts = max(scheduler.hms * 300, 8000)  # Greatly increased attempts
+    deadline = scheduler._deadline()
+    # Institutions that fall apart into independent subproblems are searched piecewise
+    subproblems = []
+    if config.get('DECOMPOSE', True):
+        with scheduler.metrics.timer('decomposition'):
+            subproblems = scheduler.subproblems()
+    found = []
+    if subproblems:
+        scheduler.metrics.inc('subproblems', len(subproblems))
+        found, construction = solve_subproblems(scheduler, subproblems, max_attempts, scheduler.hms - len(seeded),
+                                                workers=workers, on_progress=on_progress,
+                                                deadline=deadline, min_found=num_timetables - len(seeded))
+    if subproblems and not found:
+        # A subproblem came back empty; the whole institution may still be solvable
+        scheduler.metrics.inc('decomposition_fallbacks')
+        sub_stats = construction['subproblems']
+        found, construction = search_harmonies(scheduler, max_attempts, scheduler.hms - len(seeded),
+                                               workers=workers, on_progress=on_progress,
+                                               deadline=deadline, min_found=num_timetables - len(seeded))
+        construction['subproblems'] = sub_stats
+        construction['decomposition'] = 'fallback'
+    elif not subproblems:
+        found, construction = search_harmonies(scheduler, max_attempts, scheduler.hms - len(seeded),
+                                               workers=workers, on_progress=on_progress,
+                                               deadline=deadline, min_found=num_timetables - len(seeded))
+    harmony_memory = seeded + found
+    construction['cache'] = 'miss'
+    construction['warm_start'] = len(seeded)
+
+    # If we still don't have enough timetables, try with more relaxed constraints
+    if len(harmony_memory) < 3:
+        print(f"Warning: Only generated {len(harmony_memory)} valid timetables. Using relaxed constraints...")
+        relaxed_memory, construction['relaxed'] = search_harmonies(
+            scheduler, max_attempts // 10, 3 - len(harmony_memory), relaxed=True, workers=workers,
+            on_progress=on_progress, deadline=deadline)
+        harmony_memory += relaxed_memory
+
+    if not harmony_memory:
+        return iter(()), construction, {"error": "Failed to generate timetables. The algorithm couldn't find valid schedules that fill the time slots properly. Try:\n• Adding more classrooms\n• Adding more faculty\n• Reducing classes per week for subjects\n• Increasing slots per day\n• Adding more days per week", "construction": construction}
+
+    harmony_memory.sort(key=lambda x: x[1], reverse=True)
+
+    # Double-check generated timetables for conflicts, exporting one at a time as they are consumed
+    def validated_options():
         validated_timetables = []
-        for timetable, score in harmony_memory:
-            if has_clashes(timetable):
+        while harmony_memory and len(validated_timetables) < num_timetables:
+            timetable, score = harmony_memory.pop()
+            with scheduler.metrics.timer('validation'):
+                timetable = scheduler.export(timetable)
+                clashes = has_clashes(timetable)
+            if clashes:
                 print(f"Warning: Generated timetable has conflicts, skipping...")
+                scheduler.metrics.inc('harmonies_rejected', reason='validation')
                 continue
             validated_timetables.append((timetable, score))
-
-        if not validated_timetables:
-            return jsonify({"error": "Generated timetables contain conflicts. This may be due to insufficient resources or overly restrictive constraints. Try:\n• Adding more classrooms\n• Adding more faculty\n• Reducing classes per subject\n• Increasing time slots per day\n• Reducing the number of days per week"}), 500
-
-        # Generate multiple optimized timetable options
-        timetables_data = []
-        for i in range(min(num_timetables, len(validated_timetables))):
-            timetable, score = validated_timetables[i]
-
-            # Save each timetable option to database with different versions
-            db_timetable = Timetable(
-                version=i+1,
-                status='pending_approval',
-                department=config.get('DEPARTMENT'),
-                shift=config.get('SHIFT'),
-                created_by_id=current_user.id if current_user.is_authenticated else None
-            )
-            db.session.add(db_timetable)
-            db.session.flush()
-
-            for slot_data in timetable:
-                slot_data['approval_status'] = 'pending'
-                slot_data['approved_by_id'] = None
-                slot_data['change_reason'] = None
-
-                db_slot = Slot(
-                    timetable_id=db_timetable.id,
-                    subject_id=slot_data['subject_id'],
-                    subject_name=slot_data['subject_name'],
-                    teacher_id=slot_data['teacher_id'],
-                    teacher_name=slot_data['teacher_name'],
-                    batch_id=slot_data['batch_id'],
-                    batch_name=slot_data['batch_name'],
-                    room_id=slot_data['room_id'],
-                    day=slot_data['day'],
-                    slot_index=slot_data['slot_index'],
-                    approval_status='pending'
-                )
-                db.session.add(db_slot)
-
-            timetables_data.append({
+            yield timetable, score
+        if use_cache and validated_timetables:
+            cache_store(cache_key, problem_key, validated_timetables)
+    return validated_options(), construction, None
+
+def persist_options(scheduler, options, config, created_by_id=None, first_version=1):
+    """Save (slots, score) options as pending Timetables numbered from first_version, in one
+    transaction, and return their response records. One flush assigns all the timetable ids,
+    then the slots of every option go in as a single executemany INSERT."""
+    persist_started = time.perf_counter()
+    timetables_data = []
+    db_timetables = [Timetable(
+        version=first_version + i,
+        status='pending_approval',
+        department=config.get('DEPARTMENT'),
+        shift=config.get('SHIFT'),
+        created_by_id=created_by_id
+    ) for i in range(len(options))]
+    db.session.add_all(db_timetables)
+    with scheduler.metrics.timer('db_flush'):
+        db.session.flush()
+
+    slot_rows = []
+    for (timetable, score), db_timetable in zip(options, db_timetables):
+        for slot_data in timetable:
+            slot_data['approval_status'] = 'pending'
+            slot_data['approved_by_id'] = None
+            slot_data['change_reason'] = None
+            slot_rows.append({
                 'timetable_id': db_timetable.id,
-                'version': i+1,
-                'slots': timetable,
-                'score': score,
-                'department': config.get('DEPARTMENT'),
-                'shift': config.get('SHIFT')
+                'subject_id': slot_data['subject_id'],
+                'subject_name': slot_data['subject_name'],
+                'teacher_id': slot_data['teacher_id'],
+                'teacher_name': slot_data['teacher_name'],
+                'batch_id': slot_data['batch_id'],
+                'batch_name': slot_data['batch_name'],
+                'room_id': slot_data['room_id'],
+                'day': slot_data['day'],
+                'slot_index': slot_data['slot_index'],
+                'approval_status': 'pending'
             })
 
+        timetables_data.append({
+            'timetable_id': db_timetable.id,
+            'version': db_timetable.version,
+            'slots': timetable,
+            'score': score,
+            'department': config.get('DEPARTMENT'),
+            'shift': config.get('SHIFT')
+        })
+    if slot_rows:
+        with scheduler.metrics.timer('db_insert_slots'):
+            db.session.execute(insert(Slot), slot_rows)
+
+    with scheduler.metrics.timer('db_commit'):
         db.session.commit()
+    scheduler.metrics.observe('persistence', time.perf_counter() - persist_started)
+    scheduler.metrics.inc('slots_persisted', len(slot_rows))
+    return timetables_data
+
+def new_scheduler(data):
+    """TemporalHarmonyScheduler for a validated generate payload, with the RNG seeded from SEED"""
+    config = data['config']
+    # Convert lists to dicts for lookup
+    teachers = {t['id']: t for t in data['teachers']}
+    batches = {b['id']: b for b in data['batches']}
+    scheduler = TemporalHarmonyScheduler(config, data['rooms'], teachers, batches, data['subjects'])
+    if 'SEED' in config:
+        random.seed(config['SEED'])
+    return scheduler
+
+def run_generation(data, created_by_id=None, on_progress=None, include_metrics=False):
+    """Search for timetables for a generate payload and persist the best options as pending
+    Timetables. Returns (response body, HTTP status); used by /api/generate and generation jobs.
+    on_progress is forwarded to search_harmonies. The phase timings and counters end up in the
+    metrics registry, and in the response too with include_metrics or config INCLUDE_METRICS."""
+    scheduler = None
+    try:
+        error = validate_generation_payload(data)
+        if error:
+            return {"error": error}, 400
+
+        config = data['config']
+        scheduler = new_scheduler(data)
+        options, construction, error = find_options(scheduler, data, on_progress)
+        if error:
+            return error, 500
+        options = list(options)
+        if not options:
+            return CONFLICTING_OPTIONS_ERROR, 500
+
+        timetables_data = persist_options(scheduler, options, config, created_by_id)
         result = {
             "message": f"Generated {len(timetables_data)} optimized timetable options!",
-            "timetables": timetables_data
+            "timetables": timetables_data,
+            "construction": construction
         }
-        return jsonify(result), 200
+        if include_metrics or config.get('INCLUDE_METRICS'):
+            result['metrics'] = scheduler.metrics.to_dict()
+        return result, 200
+    except Exception as e:
+        db.session.rollback()
+        return {"error": f"Exception occurred: {str(e)}"}, 500
+    finally:
+        if scheduler is not None:
+            metrics_registry.merge(scheduler.metrics)
+
+def stream_options(scheduler, options, construction, config, created_by_id=None, include_metrics=False):
+    """NDJSON lines for /api/generate?stream=1: one {"type": "option", ...} record per option,
+    written as soon as find_options() yields it and it is committed, then a {"type": "done", ...}
+    summary (or a {"type": "error", ...} record if no option survives validation or saving fails)"""
+    saved = 0
+    try:
+        for option in options:
+            record, = persist_options(scheduler, [option], config, created_by_id, first_version=saved + 1)
+            saved += 1
+            yield json.dumps(dict(record, type='option')) + '\n'
+        if not saved:
+            yield json.dumps(dict(CONFLICTING_OPTIONS_ERROR, type='error', count=0)) + '\n'
+            return
+        summary = {
+            'type': 'done',
+            'message': f"Generated {saved} optimized timetable options!",
+            'count': saved,
+            'construction': construction
+        }
+        if include_metrics or config.get('INCLUDE_METRICS'):
+            summary['metrics'] = scheduler.metrics.to_dict()
+        yield json.dumps(summary) + '\n'
+    except Exception as e:
+        db.session.rollback()
+        yield json.dumps({'type': 'error', 'error': f"Exception occurred: {str(e)}", 'count': saved}) + '\n'
+    finally:
+        metrics_registry.merge(scheduler.metrics)
+
+@app.route('/api/generate', methods=['POST'])
+def generate():
+    created_by_id = current_user.id if current_user.is_authenticated else None
+    include_metrics = request.args.get('metrics') in ('1', 'true')
+    if request.args.get('stream') in ('1', 'true') or request.accept_mimetypes.best == 'application/x-ndjson':
+        return generate_stream(request.get_json(silent=True), created_by_id, include_metrics)
+    request_metrics = Metrics()
+    with request_metrics.timer('generate_request'):
+        body, status = run_generation(request.get_json(silent=True), created_by_id,
+                                      include_metrics=include_metrics)
+    request_metrics.inc('generate_requests', status=status)
+    metrics_registry.merge(request_metrics)
+    return jsonify(body), status
+
+def generate_stream(data, created_by_id, include_metrics):
+    """Streaming /api/generate: the search runs before the response starts, so its errors keep
+    their HTTP status; the options are then saved and sent one at a time"""
+    request_metrics = Metrics()
+    error = validate_generation_payload(data)
+    if error:
+        request_metrics.inc('generate_requests', status=400)
+        metrics_registry.merge(request_metrics)
+        return jsonify({"error": error}), 400
+    scheduler = new_scheduler(data)
+    try:
+        options, construction, error = find_options(scheduler, data)
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": f"Exception occurred: {str(e)}"}), 500
+        options, error = None, {"error": f"Exception occurred: {str(e)}"}
+    if error:
+        request_metrics.inc('generate_requests', status=500)
+        metrics_registry.merge(scheduler.metrics)
+        metrics_registry.merge(request_metrics)
+        return jsonify(error), 500
+    request_metrics.inc('generate_requests', status=200)
+    metrics_registry.merge(request_metrics)
+    return app.response_class(stream_with_context(stream_options(
+        scheduler, options, construction, data['config'], created_by_id, include_metrics)),
+        mimetype='application/x-ndjson')
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Process-wide generation counters and phase timings as JSON, or in the Prometheus text
+    format with ?format=prometheus"""
+    if request.args.get('format') == 'prometheus':
+        return metrics_registry.to_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+    return jsonify(metrics_registry.to_dict()), 200
+
+# Background generation jobs
+JOB_PROGRESS_INTERVAL = 1.0  # Seconds between progress writes of a running job
+JOB_HEARTBEAT_INTERVAL = 20.0  # Seconds between lease renewals of a running job, whatever its progress
+JOB_STALE_AFTER = timedelta(minutes=2)  # A queued/running job untouched this long has lost its worker
+_job_executor = ThreadPoolExecutor(max_workers=app.config['GENERATION_JOB_THREADS'])
+_stale_jobs_checked = False
+
+def _claim_job(job_id):
+    """Atomically mark a queued or stale job as running here. Returns the lease token the run
+    must present on every later write, or None if another worker owns the job"""
+    now = datetime.utcnow()
+    owner = uuid.uuid4().hex
+    claimed = db.session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == job_id,
+               or_(GenerationJob.status == 'queued',
+                   and_(GenerationJob.status == 'running', GenerationJob.updated_at < now - JOB_STALE_AFTER)))
+        .values(status='running', owner=owner, updated_at=now, attempts=0, valid_harmonies=0, best_dissonance=None)
+    ).rowcount == 1
+    db.session.commit()
+    return owner if claimed else None
+
+def _update_owned_job(connection, job_id, owner, **values):
+    """Write values to a job this run still owns; False once the lease has been lost"""
+    return connection.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == job_id, GenerationJob.owner == owner, GenerationJob.status == 'running')
+        .values(updated_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+def _heartbeat(engine, job_id, owner, stop):
+    """Renew a running job's lease until stop is set, on a connection of its own, so long
+    stretches without search progress (a big subproblem, the final commit) don't make it stale"""
+    while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+        with engine.begin() as connection:
+            if not _update_owned_job(connection, job_id, owner):
+                return
+
+def _run_job(job_id):
+    """Executor task: run one generation job and store its progress and result"""
+    with app.app_context():
+        owner = _claim_job(job_id)
+        if owner is None:
+            return
+        payload, created_by_id = db.session.query(GenerationJob.payload, GenerationJob.created_by_id) \
+            .filter(GenerationJob.id == job_id).one()
+        progress = {'attempts': 0, 'valid_harmonies': 0, 'best_dissonance': None}
+        last_write = time.monotonic()
+
+        def on_progress(attempts, found):
+            nonlocal last_write
+            progress['attempts'] += attempts
+            progress['valid_harmonies'] += len(found)
+            scores = [score for _, score in found]
+            if progress['best_dissonance'] is not None:
+                scores.append(progress['best_dissonance'])
+            if scores:
+                progress['best_dissonance'] = min(scores)
+            if time.monotonic() - last_write >= JOB_PROGRESS_INTERVAL:
+                _update_owned_job(db.session, job_id, owner, **progress)
+                db.session.commit()
+                last_write = time.monotonic()
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(db.engine, job_id, owner, stop), daemon=True)
+        heartbeat.start()
+        try:
+            body, status = run_generation(json.loads(payload), created_by_id, on_progress)
+        finally:
+            stop.set()
+            heartbeat.join()
+        now = datetime.utcnow()
+        if not _update_owned_job(db.session, job_id, owner, status='completed' if status == 200 else 'failed',
+                                 result=json.dumps(body), error=body.get('error'), finished_at=now, **progress):
+            print(f"Generation job {job_id} was taken over by another worker; its result is discarded")
+        db.session.commit()
+
+def _is_stale(job):
+    return job.status in ('queued', 'running') and job.updated_at < datetime.utcnow() - JOB_STALE_AFTER
+
+@app.before_request
+def resume_stale_jobs():
+    """Once per process, pick up jobs whose worker died before finishing them"""
+    global _stale_jobs_checked
+    if _stale_jobs_checked:
+        return
+    _stale_jobs_checked = True
+    for job in GenerationJob.query.filter(GenerationJob.status.in_(['queued', 'running'])).all():
+        if _is_stale(job):
+            _job_executor.submit(_run_job, job.id)
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_generation_job():
+    data = request.get_json(silent=True)
+    error = validate_generation_payload(data)
+    if error:
+        return jsonify({"error": error}), 400
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        payload=json.dumps(data),
+        created_by_id=current_user.id if current_user.is_authenticated else None
+    )
+    db.session.add(job)
+    db.session.commit()
+    _job_executor.submit(_run_job, job.id)
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for('get_generation_job', job_id=job.id)
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    job = GenerationJob.query.get_or_404(job_id)
+    if _is_stale(job):
+        _job_executor.submit(_run_job, job.id)
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "valid_harmonies": job.valid_harmonies,
+        "best_dissonance": job.best_dissonance,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result": json.loads(job.result) if job.result else None
+    }), 200
+
+# Timetable repair
+WEEK_DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def _load_scheduler_inputs():
+    """Rooms, teachers, batches and subjects from the database, shaped like a generate payload
+    after run_generation() has keyed teachers and batches by id"""
+    rooms = [{
+        'id': c.id,
+        'name': c.name,
+        'capacity': c.capacity,
+        'room_type': c.room_type,
+        'is_available': c.is_available
+    } for c in Classroom.query.all()]
+    _, unavailable = faculty_relations()
+    teachers = {f.id: {'id': f.id, 'name': f.name, 'unavailable': unavailable[f.id]}
+                for f in db.session.query(Faculty.id, Faculty.name)}
+    batches = {b.id: {'id': b.id, 'name': b.name, 'size': b.size}
+               for b in db.session.query(Batch.id, Batch.name, Batch.size)}
+    subject_batches, _ = subject_relations()
+    subjects = [{
+        'id': s.id,
+        'name': s.name,
+        'teacher': s.teacher_id,
+        'batches': subject_batches[s.id],
+        'per_week': s.per_week,
+        'needs_lab': s.needs_lab
+    } for s in db.session.query(Subject.id, Subject.name, Subject.teacher_id, Subject.per_week, Subject.needs_lab)]
+    return rooms, teachers, batches, subjects
+
+def validate_repair_payload(data):
+    """Return an error message for a malformed repair body, or None"""
+    if not isinstance(data, dict):
+        return "Invalid data format. Expected a JSON object."
+    for key in ('faculty', 'classrooms'):
+        if key in data and data[key] is not None and (
+                not isinstance(data[key], list) or not all(isinstance(item, str) for item in data[key])):
+            return f"Invalid data format. {key} must be an array of ids."
+    if 'config' in data and data['config'] is not None and not isinstance(data['config'], dict):
+        return "Invalid data format. config must be an object."
+    return None
+
+@app.route('/api/timetables/<int:timetable_id>/repair', methods=['POST'])
+def repair_timetable(timetable_id):
+    """Re-place the lectures of a timetable that the current faculty, subject and classroom data
+    no longer allow: the teacher is now unavailable at that time, the subject moved to another
+    teacher, or the classroom is no longer available. Approved slots stay pinned where they are;
+    those that break a constraint are reported as conflicts. Moved slots go back to pending.
+
+    Optional body: faculty and classrooms, the ids of the changed entities, limit the
+    availability checks to their lectures; config overrides DAYS_OF_WEEK and SLOTS_PER_DAY,
+    which default to the days and slots the timetable uses."""
+    started = time.monotonic()
+    Timetable.query.get_or_404(timetable_id)
+    data = request.get_json(silent=True)
+    data = {} if data is None else data
+    error = validate_repair_payload(data)
+    if error:
+        return jsonify({"error": error}), 400
+    slots = Slot.query.filter_by(timetable_id=timetable_id).order_by(Slot.id).all()
+    if not slots:
+        return jsonify({'error': 'Timetable has no slots'}), 400
+
+    rooms, teachers, batches, subjects = _load_scheduler_inputs()
+    used_days = {slot.day for slot in slots}
+    config = {
+        'DAYS_OF_WEEK': [d for d in WEEK_DAYS if d in used_days] + sorted(used_days - set(WEEK_DAYS)),
+        'SLOTS_PER_DAY': max(slot.slot_index for slot in slots) + 1
+    }
+    config.update(data.get('config') or {})
+    scheduler = TemporalHarmonyScheduler(config, rooms, teachers, batches, subjects)
+
+    subject_index = {subject['id']: i for i, subject in enumerate(subjects)}
+    teacher_index = {t: i for i, t in enumerate(scheduler.teacher_ids)}
+    batch_index = {b: i for i, b in enumerate(scheduler.batch_ids)}
+    room_index = {r: i for i, r in enumerate(scheduler.room_ids)}
+    day_index = {d: i for i, d in enumerate(scheduler.days)}
+    usable_rooms = sum(1 << i for i, room in enumerate(rooms) if room['is_available'] is not False)
+    changed_faculty = set(data.get('faculty') or ())
+    changed_rooms = set(data.get('classrooms') or ())
+    check_all = not changed_faculty and not changed_rooms
+
+    lectures, movable, pinned, conflicts = [], [], [], []
+    for i, slot in enumerate(slots):
+        if (slot.subject_id not in subject_index or slot.batch_id not in batch_index or
+                slot.room_id not in room_index or slot.day not in day_index or
+                slot.slot_index >= scheduler.slots_per_day):
+            return jsonify({'error': f'Slot {slot.id} refers to a subject, batch, classroom or time '
+                                     f'that is not in the current data'}), 409
+        subject = subjects[subject_index[slot.subject_id]]
+        lecture = Lecture(subject_index[slot.subject_id], teacher_index[subject['teacher']], batch_index[slot.batch_id],
+                          room_index[slot.room_id], day_index[slot.day], slot.slot_index)
+        lectures.append(lecture)
+        affected = (
+            subject['teacher'] != slot.teacher_id or
+            ((check_all or slot.teacher_id in changed_faculty) and
+             (lecture.day, lecture.slot) in scheduler.teacher_unavailable[lecture.teacher]) or
+            ((check_all or slot.room_id in changed_rooms) and not usable_rooms >> lecture.room & 1))
+        if slot.approval_status == 'approved':
+            pinned.append(i)
+            if affected:
+                conflicts.append(slot.id)
+        elif affected:
+            movable.append(i)
+
+    repaired, unplaced = scheduler.repair(lectures, movable, pinned, usable_rooms)
+    moved = []
+    for slot, old, new in zip(slots, lectures, repaired):
+        if old is new:
+            continue
+        moved.append({
+            'slot_id': slot.id,
+            'from': {'day': slot.day, 'slot_index': slot.slot_index, 'room_id': slot.room_id},
+            'to': {'day': scheduler.days[new.day], 'slot_index': new.slot, 'room_id': scheduler.room_ids[new.room]}
+        })
+        slot.day = scheduler.days[new.day]
+        slot.slot_index = new.slot
+        slot.room_id = scheduler.room_ids[new.room]
+        slot.teacher_id = scheduler.teacher_ids[new.teacher]
+        slot.teacher_name = scheduler.teacher_names[new.teacher]
+        slot.approval_status = 'pending'
+        slot.approved_by_id = None
+        slot.approved_at = None
+    db.session.commit()
+
+    return jsonify({
+        'timetable_id': timetable_id,
+        'affected': len(movable),
+        'moved': moved,
+        'unplaced': [slots[i].id for i in unplaced],
+        'conflicts': conflicts,
+        'seconds': round(time.monotonic() - started, 4)
+    }), 200
 
 @app.route('/api/shifts', methods=['POST'])
 def add_shift():
@@ -775,66 +2602,84 @@ def serve_index():
 def serve_dashboard():
     return render_template('dashboard.html')
 
+def _slot_dict(slot):
+    return {
+        'id': slot.id,
+        'subject_id': slot.subject_id,
+        'subject_name': slot.subject_name,
+        'teacher_id': slot.teacher_id,
+        'teacher_name': slot.teacher_name,
+        'batch_id': slot.batch_id,
+        'batch_name': slot.batch_name,
+        'room_id': slot.room_id,
+        'day': slot.day,
+        'slot_index': slot.slot_index,
+        'approval_status': slot.approval_status,
+        'approved_by_id': slot.approved_by_id,
+        'change_reason': slot.change_reason
+    }
+
 @app.route('/api/dashboard-data', methods=['GET'])
 def get_dashboard_data():
+    """Pending timetable options with their slot counts, overall approval stats and the top
+    ?top=N (default 5) approvers. Slots are left out unless ?include_slots=1; the dashboard
+    fetches the ones it shows from /api/timetables/<id>/slots."""
     try:
-        # Get all pending timetables (multiple options)
-        pending_timetables = Timetable.query.filter_by(status='pending_approval').order_by(Timetable.created_at.desc()).all()
-
-        if not pending_timetables:
+        top = request.args.get('top', 5, type=int)
+        pending = Timetable.status == 'pending_approval'
+        approved = func.coalesce(func.sum(case((Slot.approval_status == 'approved', 1), else_=0)), 0)
+
+        # Get all pending timetables (multiple options) with their counts in one GROUP BY
+        rows = (db.session.query(Timetable, func.count(Slot.id), approved)
+                .outerjoin(Slot, Slot.timetable_id == Timetable.id)
+                .filter(pending)
+                .group_by(Timetable.id)
+                .order_by(Timetable.created_at.desc())
+                .all())
+
+        if not rows:
             return jsonify({
                 "timetables": [],
                 "stats": {"approved_slots": 0, "total_slots": 0, "approval_progress": 0, "utilization": "0%", "load_status": "No data", "conflicts": 0},
                 "users": []
             }), 200
 
-        timetables_data = []
-        for timetable in pending_timetables:
-            slots = Slot.query.filter_by(timetable_id=timetable.id).all()
-            timetable_data = [{
-                'id': slot.id,
-                'subject_id': slot.subject_id,
-                'subject_name': slot.subject_name,
-                'teacher_id': slot.teacher_id,
-                'teacher_name': slot.teacher_name,
-                'batch_id': slot.batch_id,
-                'batch_name': slot.batch_name,
-                'room_id': slot.room_id,
-                'day': slot.day,
-                'slot_index': slot.slot_index,
-                'approval_status': slot.approval_status,
-                'approved_by_id': slot.approved_by_id,
-                'change_reason': slot.change_reason
-            } for slot in slots]
-
-            timetables_data.append({
-                'id': timetable.id,
-                'version': timetable.version,
-                'department': timetable.department,
-                'shift': timetable.shift,
-                'slots': timetable_data,
-                'total_slots': len(slots),
-                'approved_slots': len([s for s in slots if s.approval_status == 'approved'])
-            })
-
-        # Calculate overall stats
-        all_slots = []
-        for t in timetables_data:
-            all_slots.extend(t['slots'])
-
-        total_slots = len(all_slots)
-        approved_slots = len([s for s in all_slots if s['approval_status'] == 'approved'])
+        timetables_data = [{
+            'id': timetable.id,
+            'version': timetable.version,
+            'department': timetable.department,
+            'shift': timetable.shift,
+            'created_at': timetable.created_at.isoformat() if timetable.created_at else None,
+            'total_slots': total,
+            'approved_slots': approved_count
+        } for timetable, total, approved_count in rows]
+
+        if request.args.get('include_slots') in ('1', 'true'):
+            slots_by_timetable = defaultdict(list)
+            for slot in (Slot.query.join(Timetable).filter(pending)
+                         .order_by(Slot.timetable_id, Slot.id).all()):
+                slots_by_timetable[slot.timetable_id].append(_slot_dict(slot))
+            for t in timetables_data:
+                t['slots'] = slots_by_timetable[t['id']]
+
+        total_slots = sum(t['total_slots'] for t in timetables_data)
+        approved_slots = sum(t['approved_slots'] for t in timetables_data)
         approval_progress = (approved_slots / total_slots * 100) if total_slots > 0 else 0
 
-        # Calculate utilization (simplified)
-        unique_room_slots = set()
-        for slot in all_slots:
-            unique_room_slots.add((slot['room_id'], slot['day'], slot['slot_index']))
-        utilization = f"{(len(unique_room_slots) / (5 * 4 * 3) * 100):.1f}%"  # Assuming 5 days, 4 slots, 3 rooms
-
-        # Get users for leaderboard
-        users = User.query.all()
-        users_data = [{'username': u.username, 'points': u.approval_points} for u in users]
+        # Utilization: distinct (room, day, slot) cells the pending options use, out of every
+        # room (classrooms, or the rooms the options use if more) on every day and slot they cover
+        used_cells = db.session.query(func.count()).select_from(
+            db.select(Slot.room_id, Slot.day, Slot.slot_index).join(Timetable).where(pending).distinct().subquery()
+        ).scalar()
+        num_rooms, num_days, max_slot = (db.session.query(func.count(distinct(Slot.room_id)),
+                                                          func.count(distinct(Slot.day)), func.max(Slot.slot_index))
+                                         .join(Timetable).filter(pending).one())
+        capacity = max(num_rooms, Classroom.query.count()) * num_days * ((max_slot or 0) + 1)
+        utilization = f"{(used_cells / capacity * 100 if capacity else 0):.1f}%"
+
+        # Top approvers for the leaderboard
+        leaders = User.query.order_by(User.approval_points.desc(), User.id).limit(top).all()
+        users_data = [{'username': u.username, 'points': u.approval_points} for u in leaders]
 
         stats = {
             "approved_slots": approved_slots,
@@ -842,7 +2687,8 @@ def get_dashboard_data():
             "approval_progress": approval_progress,
             "utilization": utilization,
             "load_status": "Normal",  # Placeholder
-            "conflicts": 0  # Placeholder
+            "conflicts": 0,  # Placeholder
+            "users": User.query.count()
         }
 
         return jsonify({
@@ -853,41 +2699,45 @@ def get_dashboard_data():
     except Exception as e:
         return jsonify({"error": f"Failed to fetch dashboard data: {str(e)}"}), 500
 
-        stats = {
-            "approved_slots": approved_slots,
-            "total_slots": total_slots,
-            "approval_progress": approval_progress,
-            "utilization": utilization,
-            "load_status": "Normal",
-            "conflicts": 0  # Simplified
-        }
-
-        return jsonify({
-            "timetables": timetables_data,
-            "stats": stats,
-            "users": users_data
-        }), 200
-    except Exception as e:
-        return jsonify({"error": f"Failed to fetch dashboard data: {str(e)}"}), 500
+@app.route('/api/timetables/<int:timetable_id>/slots', methods=['GET'])
+def get_timetable_slots(timetable_id):
+    Timetable.query.get_or_404(timetable_id)
+    slots = Slot.query.filter_by(timetable_id=timetable_id).order_by(Slot.id).all()
+    return jsonify([_slot_dict(slot) for slot in slots]), 200
+
+# Approvals are single UPDATE statements; their row counts say how many slots were approved and
+# the approver's points go up by 10 per slot in one atomic UPDATE of the user row
+APPROVAL_POINTS = 10
+APPROVE_IDS_PER_STATEMENT = 500  # keeps IN lists below SQLite's bound-parameter limit
+
+def _approve_where(approver_id, *criteria):
+    """Approve the slots matching criteria; returns how many were approved"""
+    return db.session.execute(
+        update(Slot).where(*criteria)
+        .values(approval_status='approved', approved_by_id=approver_id, approved_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def _award_points(user_id, approved):
+    if approved:
+        db.session.execute(update(User).where(User.id == user_id)
+                           .values(approval_points=func.coalesce(User.approval_points, 0) + APPROVAL_POINTS * approved)
+                           .execution_options(synchronize_session=False))
 
 @app.route('/api/approve/<int:slot_id>', methods=['POST'])
 def approve_slot(slot_id):
     try:
-        slot = Slot.query.get_or_404(slot_id)
-        slot.approval_status = 'approved'
-        slot.approved_at = datetime.utcnow()
-        # In a real app, you'd get the current user from session
-        # For now, we'll use a dummy user ID
-        slot.approved_by_id = 1  # TODO: Get from current user session
-        
-        # Award points to the approver
-        if slot.approved_by_id:
-            user = User.query.get(slot.approved_by_id)
-            if user:
-                user.approval_points += 10
-        
+        # Without a login the approval is credited to user 1, as before
+        approver_id = current_user.id if current_user.is_authenticated else 1
+        approved = _approve_where(approver_id, Slot.id == slot_id, Slot.approval_status != 'approved')
+        if not approved and db.session.get(Slot, slot_id) is None:
+            db.session.rollback()
+            return jsonify({"error": "Slot not found"}), 404
+        _award_points(approver_id, approved)
         db.session.commit()
-        return jsonify({"message": "Slot approved successfully", "points_awarded": 10}), 200
+        if not approved:
+            return jsonify({"message": "Slot already approved", "points_awarded": 0}), 200
+        return jsonify({"message": "Slot approved successfully", "points_awarded": APPROVAL_POINTS}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Failed to approve slot: {str(e)}"}), 500
@@ -896,20 +2746,38 @@ def approve_slot(slot_id):
 @login_required
 def approve_all_slots(timetable_id):
     try:
-        slots = Slot.query.filter_by(timetable_id=timetable_id, approval_status='pending').all()
-
-        for slot in slots:
-            slot.approval_status = 'approved'
-            slot.approved_by_id = current_user.id
-            slot.approved_at = datetime.utcnow()
-
-            # Award points to the approver
-            current_user.approval_points += 10
+        approved = _approve_where(current_user.id, Slot.timetable_id == timetable_id, Slot.approval_status == 'pending')
+        _award_points(current_user.id, approved)
+        db.session.commit()
+        return jsonify({
+            "message": f"Successfully approved {approved} slots",
+            "points_awarded": approved * APPROVAL_POINTS
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to approve slots: {str(e)}"}), 500
 
+@app.route('/api/approve_slots', methods=['POST'])
+@login_required
+def approve_slots():
+    """Approve the slots in {"slot_ids": [...]} that are not approved yet, all in one transaction"""
+    data = request.get_json(silent=True) or {}
+    slot_ids = data.get('slot_ids')
+    if not isinstance(slot_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in slot_ids):
+        return jsonify({"error": "slot_ids must be a list of slot ids"}), 400
+    slot_ids = list(dict.fromkeys(slot_ids))
+    try:
+        approved = 0
+        for i in range(0, len(slot_ids), APPROVE_IDS_PER_STATEMENT):
+            approved += _approve_where(current_user.id, Slot.id.in_(slot_ids[i:i + APPROVE_IDS_PER_STATEMENT]),
+                                       Slot.approval_status != 'approved')
+        _award_points(current_user.id, approved)
         db.session.commit()
         return jsonify({
-            "message": f"Successfully approved {len(slots)} slots",
-            "points_awarded": len(slots) * 10
+            "message": f"Successfully approved {approved} slots",
+            "requested": len(slot_ids),
+            "approved": approved,
+            "points_awarded": approved * APPROVAL_POINTS
         }), 200
     except Exception as e:
         db.session.rollback()
@@ -923,6 +2791,8 @@ def populate_sample_data():
         # Clear existing data
         db.session.query(Slot).delete()
         db.session.query(Timetable).delete()
+        for association in (FacultySubject, FacultyUnavailability, SubjectBatch, SubjectFixedSlot, BatchElective):
+            db.session.query(association).delete()
         db.session.query(Subject).delete()
         db.session.query(Faculty).delete()
         db.session.query(Classroom).delete()
@@ -948,6 +2818,7 @@ def populate_sample_data():
         for f_data in faculty_data:
             faculty = Faculty(**f_data)
             db.session.add(faculty)
+            set_faculty_relations(faculty.id, json.loads(faculty.subjects), json.loads(faculty.unavailable_slots))
 
         # Add sample subjects
         subjects_data = [
@@ -958,6 +2829,7 @@ def populate_sample_data():
         for s_data in subjects_data:
             subject = Subject(**s_data)
             db.session.add(subject)
+            set_subject_relations(subject.id, json.loads(subject.batches), json.loads(subject.fixed_slots))
 
         # Add sample batches
         batches_data = [
@@ -966,6 +2838,7 @@ def populate_sample_data():
         for b_data in batches_data:
             batch = Batch(**b_data)
             db.session.add(batch)
+            set_batch_relations(batch.id, json.loads(batch.electives))
 
         # Add sample shifts
         shifts_data = [
@@ -975,6 +2848,7 @@ def populate_sample_data():
             shift = Shift(**sh_data)
             db.session.add(shift)
 
+        bump_version('classroom', 'faculty', 'subject', 'batch')
         db.session.commit()
         return jsonify({"message": "Sample data populated in database."}), 200
     except Exception as e:
@@ -0,0 +1,381 @@
+"""Scheduler benchmark on seeded synthetic institutions.
+
+Times timetable construction, dissonance scoring, clash checking, run() and an end-to-end
+/api/generate through the Flask test client for each institution size, and writes the
+results as JSON so runs of different releases can be compared.
+
+    python benchmark.py --sizes 5,20,100,1000 --mode greedy --output bench.json
+
+With --concurrency it instead runs approver and dashboard reader processes against the same
+database for --duration seconds, under each DB_PROFILE in --profiles, while one more process
+inserts --write-rows slots in a single transaction. It reports latencies, failed requests
+("database is locked" among them), the reads that overlapped that write and the overall
+throughput. Every profile gets a fresh database in a temporary directory, run by a child process
+because the profile is read at import, and every profile waits --busy-timeout seconds for a lock,
+so only the journaling differs. The run fails unless production loses no request, answers reads
+during the write faster than default and gets through more requests per second.
+
+    python benchmark.py --concurrency --profiles default,production
+
+Unless DATABASE_URL is set, the benchmark runs against a scratch database in a temporary
+directory, never the application's own.
+"""
+import argparse
+import atexit
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def synthetic_institution(num_batches, seed=0, rooms_per_batch=1.0, teachers_per_batch=2.0,
+                          lab_room_fraction=0.25, lab_subject_fraction=0.25, unavailability=0.05,
+                          subjects_per_batch=4, per_week=3, days=5, slots_per_day=6):
+    """A generate payload for an institution of num_batches batches. The same arguments and seed
+    always give the same institution."""
+    rnd = random.Random(seed)
+    days_of_week = DAYS[:days]
+    num_rooms = max(1, round(num_batches * rooms_per_batch))
+    num_labs = max(1, round(num_rooms * lab_room_fraction))
+    num_teachers = max(1, round(num_batches * teachers_per_batch))
+
+    rooms = [{'id': f'C{i}', 'name': f'Room {i}', 'capacity': rnd.choice([30, 40, 60]), 'room_type': 'Lecture'}
+             for i in range(num_rooms - num_labs)]
+    rooms += [{'id': f'LAB{i}', 'name': f'Lab {i}', 'capacity': rnd.choice([30, 40]), 'room_type': 'Lab'}
+              for i in range(num_labs)]
+    teachers = [{
+        'id': f'T{i}',
+        'name': f'Teacher {i}',
+        'unavailable': [f'{day}-{slot}' for day in days_of_week for slot in range(slots_per_day)
+                        if rnd.random() < unavailability]
+    } for i in range(num_teachers)]
+    batches = [{'id': f'B{i}', 'name': f'Batch {i}', 'size': rnd.choice([25, 30, 35])} for i in range(num_batches)]
+    subjects = [{
+        'id': f'S{b}_{k}',
+        'name': f'Subject {k}',
+        'teacher': f'T{rnd.randrange(num_teachers)}',
+        'batches': [f'B{b}'],
+        'per_week': per_week,
+        'needs_lab': rnd.random() < lab_subject_fraction
+    } for b in range(num_batches) for k in range(subjects_per_batch)]
+    config = {
+        'DAYS_OF_WEEK': days_of_week,
+        'SLOTS_PER_DAY': slots_per_day,
+        'NUM_TIMETABLES': 3,
+        'HARMONY_MEMORY_SIZE': 5,
+        'PITCH_ADJUSTMENT_RATE': 0.3,
+        'NUM_GENERATIONS': 200
+    }
+    return {'config': config, 'rooms': rooms, 'teachers': teachers, 'batches': batches, 'subjects': subjects}
+
+def timed(fn, repeats):
+    """Run fn repeats times; returns its last result and min/median/mean seconds"""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return result, {
+        'repeats': repeats,
+        'min': round(min(times), 6),
+        'median': round(statistics.median(times), 6),
+        'mean': round(statistics.mean(times), 6)
+    }
+
+def use_scratch_database():
+    """Point the app, which is imported lazily for this reason, at a temporary database unless
+    DATABASE_URL says otherwise"""
+    if 'DATABASE_URL' not in os.environ:
+        directory = tempfile.mkdtemp(prefix='timetable-benchmark-')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'timetable.db')
+
+def benchmark_size(num_batches, args):
+    from app import app, db, TemporalHarmonyScheduler, Timetable, has_clashes
+    payload = synthetic_institution(num_batches, seed=args.seed, rooms_per_batch=args.rooms_per_batch,
+                                    teachers_per_batch=args.teachers_per_batch,
+                                    lab_room_fraction=args.lab_room_fraction,
+                                    lab_subject_fraction=args.lab_subject_fraction,
+                                    unavailability=args.unavailability)
+    config = dict(payload['config'], CONSTRUCTION_MODE=args.mode)
+    if args.budget:
+        config['TIME_BUDGET_SECONDS'] = args.budget
+    payload['config'] = config
+    random.seed(args.seed)
+    scheduler = TemporalHarmonyScheduler(config, payload['rooms'], {t['id']: t for t in payload['teachers']},
+                                         {b['id']: b for b in payload['batches']}, payload['subjects'])
+    result = {'batches': num_batches, 'lectures': len(scheduler.lecture_pool), 'rooms': len(payload['rooms']),
+              'teachers': len(payload['teachers']), 'timings': {}}
+    timings = result['timings']
+
+    timetable, timings['random_construction'] = timed(scheduler._generate_random_valid_timetable, args.repeats)
+    result['random_construction_succeeded'] = timetable is not None
+    if args.mode != 'random' or timetable is None:
+        timetable, timings['construction'] = timed(scheduler._construct, args.repeats)
+    if timetable is not None:
+        exported = scheduler.export(timetable)
+        _, timings['calculate_dissonance'] = timed(lambda: scheduler._calculate_dissonance(timetable), args.repeats)
+        _, timings['has_clashes'] = timed(lambda: has_clashes(exported), args.repeats)
+
+    best, timings['run'] = timed(scheduler.run, args.repeats)
+    result['run_dissonance'] = scheduler._calculate_dissonance(scheduler.compile_timetable(best)) if best else None
+
+    # End to end; the cache is bypassed and the stored options are deleted again afterwards
+    client = app.test_client()
+    payload['config'] = dict(config, USE_CACHE=False)
+    responses = []
+    _, timings['generate'] = timed(lambda: responses.append(client.post('/api/generate', json=payload)), args.repeats)
+    body = responses[-1].get_json()
+    result['generate_status'] = responses[-1].status_code
+    result['generate_construction'] = body.get('construction')
+    with app.app_context():
+        for response in responses:
+            for option in response.get_json().get('timetables', []):
+                db.session.delete(db.session.get(Timetable, option['timetable_id']))
+        db.session.commit()
+    return result
+
+def latency_summary(latencies, failures):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'failed': failures,
+        'p50': round(ordered[len(ordered) // 2], 4) if ordered else None,
+        'p95': round(ordered[int(len(ordered) * 0.95)], 4) if ordered else None,
+        'max': round(ordered[-1], 4) if ordered else None
+    }
+
+def _concurrency_worker(role, requests, start_at, stop_at):
+    """One approver or reader process: waits for start_at, then sends its requests in turn, readers
+    over and over, until they run out or stop_at passes. Returns the start time and latency of
+    every request, the failures and their error messages"""
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)  # connections inherited from the parent stay with the parent
+    client = app.test_client()
+    time.sleep(max(0.0, start_at - time.time()))
+    timings, failures, errors = [], 0, set()
+    for method, url, body in itertools.cycle(requests) if role == 'read' else requests:
+        if time.time() >= stop_at:
+            break
+        started = time.time()
+        response = client.open(url, method=method, json=body)
+        timings.append((started, time.time() - started))
+        if response.status_code != 200:
+            failures += 1
+            errors.add((response.get_json(silent=True) or {}).get('error', str(response.status_code))[:120])
+    return role, timings, failures, errors
+
+def _long_write(rows, start_at):
+    """The long write: rows slots saved in one transaction, like a generation with many large
+    options. Returns when it began and finished, and its error if it failed."""
+    from app import app, db, Slot, Timetable
+    with app.app_context():
+        db.engine.dispose(close=False)
+        columns = [c.name for c in Slot.__table__.columns if c.name not in ('id', 'timetable_id')]
+        template = [tuple(getattr(slot, name) for name in columns) for slot in Slot.query.limit(1000)]
+        rows = [template[i % len(template)] for i in range(rows)]
+        statement = (f'INSERT INTO slot (timetable_id, {", ".join(columns)}) '
+                     f'VALUES ({", ".join("?" * (len(columns) + 1))})')
+        time.sleep(max(0.0, start_at - time.time()))
+        began, error = time.time(), None
+        try:
+            timetable = Timetable(version=0, status='pending_approval')
+            db.session.add(timetable)
+            db.session.flush()
+            # Straight to the driver, so the transaction is spent in SQLite rather than in parameter handling
+            db.session.connection().exec_driver_sql(statement, [(timetable.id,) + row for row in rows])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = str(e)[:120]
+        return began, time.time(), error
+
+def concurrency_run(args):
+    """Approvers and readers hitting the same database from separate processes for --duration
+    seconds, like the workers of a multi-process server, while another process saves --write-rows
+    slots in one long transaction. Every profile waits DB_BUSY_TIMEOUT_MS for a lock, so the
+    profiles differ only in what production changes: WAL journaling and the connection settings."""
+    from sqlalchemy import event
+    from app import app, db, Slot
+    with app.app_context():
+        if app.config['DB_PROFILE'] != 'production':
+            @event.listens_for(db.engine, 'connect')
+            def busy_timeout(dbapi_connection, connection_record):
+                dbapi_connection.execute(f"PRAGMA busy_timeout={app.config['DB_BUSY_TIMEOUT_MS']}")
+            db.engine.dispose()
+
+    payload = synthetic_institution(20, seed=args.seed)
+    payload['config'] = dict(payload['config'], USE_CACHE=False, CONSTRUCTION_MODE='greedy')
+    response = app.test_client().post('/api/generate', json=payload)
+    if response.status_code != 200:
+        return {'error': response.get_json().get('error')}
+    with app.app_context():
+        slot_ids = [slot_id for slot_id, in db.session.query(Slot.id).filter(Slot.approval_status == 'pending')]
+        db.engine.dispose()
+
+    tasks = [('approve', [('POST', f'/api/approve/{slot_id}', None)
+                          for slot_id in slot_ids[i::args.approvers][:args.approvals]])
+             for i in range(args.approvers)]
+    tasks += [('read', [('GET', '/api/dashboard-data', None)])] * args.readers
+    start_at = time.time() + 2.0  # time for every process to get going
+    stop_at = start_at + args.duration
+    with multiprocessing.get_context('fork').Pool(len(tasks) + 1) as pool:
+        write = pool.apply_async(_long_write, (args.write_rows, start_at + 1.0))
+        results = pool.starmap(_concurrency_worker, [(role, requests, start_at, stop_at) for role, requests in tasks])
+        write_began, write_ended, write_error = write.get()
+
+    timings = {'approve': [], 'read': []}
+    failures = dict.fromkeys(timings, 0)
+    errors = {write_error} if write_error else set()
+    for role, role_timings, role_failures, role_errors in results:
+        timings[role] += role_timings
+        failures[role] += role_failures
+        errors |= role_errors
+    finished = max([started + latency for role_timings in timings.values() for started, latency in role_timings],
+                   default=start_at)
+    reads_during_write = [latency for started, latency in timings['read']
+                          if started < write_ended and started + latency > write_began]
+    completed = sum(len(role_timings) for role_timings in timings.values()) - sum(failures.values())
+    return {
+        'seconds': round(finished - start_at, 4),
+        'write': {'rows': args.write_rows, 'seconds': round(write_ended - write_began, 4), 'failed': bool(write_error)},
+        'roles': {role: latency_summary([latency for _, latency in values], failures[role])
+                  for role, values in timings.items()},
+        'reads_during_write': latency_summary(reads_during_write, 0),
+        'throughput': round(completed / max(finished - start_at, 1e-9), 2),
+        'errors': sorted(errors)
+    }
+
+def concurrency_check(args):
+    """concurrency_run() under each DB profile, each in a child process with its own database and
+    the same busy timeout"""
+    results = {}
+    for profile in [p.strip() for p in args.profiles.split(',') if p.strip()]:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DB_PROFILE=profile, DB_BUSY_TIMEOUT_MS=str(int(args.busy_timeout * 1000)),
+                       DATABASE_URL='sqlite:///' + os.path.join(directory, 'timetable.db'))
+            command = [sys.executable, os.path.abspath(__file__), '--concurrency-run',
+                       '--approvers', str(args.approvers), '--readers', str(args.readers),
+                       '--approvals', str(args.approvals), '--duration', str(args.duration),
+                       '--write-rows', str(args.write_rows), '--seed', str(args.seed)]
+            completed = subprocess.run(command, env=env, capture_output=True, text=True)
+            lines = completed.stdout.strip().splitlines()
+            try:
+                results[profile] = json.loads(lines[-1])
+            except (IndexError, ValueError):
+                results[profile] = {'error': completed.stderr.strip()[-500:]}
+    return results
+
+def concurrency_problems(results):
+    """Where the production profile fails to beat the default one under the same load; [] if it
+    does, or if the two were not both run"""
+    if 'default' not in results or 'production' not in results:
+        return []
+    default, production = results['default'], results['production']
+    problems = [f'{profile}: {result["error"]}' for profile, result in results.items() if 'error' in result]
+    if problems:
+        return problems
+    failed = sum(summary['failed'] for summary in production['roles'].values()) + production['write']['failed']
+    if failed:
+        problems.append(f'production: {failed} failed requests')
+    if not default['reads_during_write']['requests']:
+        problems.append('no dashboard read overlapped the long write; raise --write-rows')
+    elif not production['reads_during_write']['max'] < default['reads_during_write']['max']:
+        problems.append(f'production dashboard reads during the long write are not faster: max '
+                        f'{production["reads_during_write"]["max"]}s against {default["reads_during_write"]["max"]}s')
+    if not production['throughput'] > default['throughput']:
+        problems.append(f'production throughput {production["throughput"]}/s is not above '
+                        f'default {default["throughput"]}/s')
+    return problems
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the timetable scheduler on synthetic institutions')
+    parser.add_argument('--sizes', default='5,20,100', help='Comma separated numbers of batches (default 5,20,100)')
+    parser.add_argument('--mode', default='random', choices=['random', 'greedy'], help='CONSTRUCTION_MODE')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per timing')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rooms-per-batch', type=float, default=1.0)
+    parser.add_argument('--teachers-per-batch', type=float, default=2.0)
+    parser.add_argument('--lab-room-fraction', type=float, default=0.25, help='Share of rooms that are labs')
+    parser.add_argument('--lab-subject-fraction', type=float, default=0.25, help='Share of subjects that need a lab')
+    parser.add_argument('--unavailability', type=float, default=0.05,
+                        help='Probability that a teacher is unavailable in a given slot')
+    parser.add_argument('--budget', type=float, default=30.0, help='TIME_BUDGET_SECONDS per run()/generate (0 = none)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--concurrency', action='store_true',
+                        help='Run the concurrency check instead of the scheduler benchmark')
+    parser.add_argument('--concurrency-run', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--profiles', default='default,production', help='DB_PROFILE values to compare')
+    parser.add_argument('--approvers', type=int, default=4, help='Processes approving slots one by one')
+    parser.add_argument('--readers', type=int, default=2, help='Processes loading the dashboard')
+    parser.add_argument('--approvals', type=int, default=500, help='Slots each approver process approves at most')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds the approvers and readers run')
+    parser.add_argument('--write-rows', type=int, default=300000, help='Slots saved by the long write transaction')
+    parser.add_argument('--busy-timeout', type=float, default=15.0,
+                        help='Seconds every profile waits for a lock (DB_BUSY_TIMEOUT_MS)')
+    args = parser.parse_args()
+    if not args.concurrency:
+        use_scratch_database()
+
+    if args.concurrency_run:
+        print(json.dumps(concurrency_run(args)))
+        return
+
+    report = {
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'arguments': vars(args),
+        'results': []
+    }
+    if args.concurrency:
+        report['concurrency'] = concurrency_check(args)
+        for profile, result in report['concurrency'].items():
+            print(f'{profile}: {result.get("seconds")}s, {result.get("throughput")} requests/s {result.get("error", "")}')
+            for role, summary in result.get('roles', {}).items():
+                print(f'  {role:<9} {summary["requests"]:>5} requests, {summary["failed"]} failed, '
+                      f'p95 {summary["p95"]}s, max {summary["max"]}s')
+            if 'write' in result:
+                during = result['reads_during_write']
+                print(f'  write     {result["write"]["rows"]} rows in {result["write"]["seconds"]}s; '
+                      f'{during["requests"]} reads meanwhile, p95 {during["p95"]}s, max {during["max"]}s')
+        report['concurrency_problems'] = concurrency_problems(report['concurrency'])
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Results written to {args.output}')
+        for problem in report['concurrency_problems']:
+            print(f'FAILED: {problem}')
+        if report['concurrency_problems']:
+            sys.exit(1)
+        return
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        print(f'Benchmarking {size} batches...')
+        result = benchmark_size(size, args)
+        report['results'].append(result)
+        for name, timing in result['timings'].items():
+            print(f'  {name:<22} median {timing["median"]:.4f}s')
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+if __name__ == '__main__':
+    main()
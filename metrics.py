@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+class Metrics:
+    """Counters and phase timers. Counters and timers are keyed by name plus optional labels;
+    timers keep the count, total and maximum of their observations in seconds.
+
+    The scheduler and run_generation() record into a Metrics of their own, which is merged into
+    the process-wide registry once a generation finishes, so hot loops never touch a lock."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.timers = {}
+
+    def __getstate__(self):
+        # Schedulers travel to process-pool workers with their Metrics; locks do not pickle
+        return {'counters': self.counters, 'timers': self.timers}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.counters.update(state['counters'])
+        self.timers.update(state['timers'])
+
+    def inc(self, name, amount=1, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        timer = self.timers.get(key)
+        if timer is None:
+            self.timers[key] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def merge(self, other):
+        """Add the counters and timers of other (a Metrics or a drain() result) to this one"""
+        counters, timers = (other.counters, other.timers) if isinstance(other, Metrics) else other
+        with self._lock:
+            for key, value in counters.items():
+                self.counters[key] += value
+            for key, (count, total, longest) in timers.items():
+                timer = self.timers.get(key)
+                if timer is None:
+                    self.timers[key] = [count, total, longest]
+                else:
+                    timer[0] += count
+                    timer[1] += total
+                    timer[2] = max(timer[2], longest)
+
+    def drain(self):
+        """Return the (counters, timers) recorded so far and start over"""
+        with self._lock:
+            drained = (dict(self.counters), {key: list(timer) for key, timer in self.timers.items()})
+            self.counters.clear()
+            self.timers.clear()
+        return drained
+
+    def to_dict(self):
+        """JSON-friendly snapshot: name -> value, or name -> {labels: value} for labelled series"""
+        def put(result, name, labels, value):
+            if labels:
+                result.setdefault(name, {})[','.join(f'{k}={v}' for k, v in labels)] = value
+            else:
+                result[name] = value
+        with self._lock:
+            counters, timers = {}, {}
+            for (name, labels), value in sorted(self.counters.items()):
+                put(counters, name, labels, value)
+            for (name, labels), (count, total, longest) in sorted(self.timers.items()):
+                put(timers, name, labels, {'count': count, 'seconds': round(total, 6), 'max': round(longest, 6),
+                                           'mean': round(total / count, 6) if count else 0.0})
+        return {'counters': counters, 'timers': timers}
+
+    def to_prometheus(self, prefix='timetable_'):
+        """Prometheus text exposition: counters as <name>_total, timers as a <name>_seconds summary
+        (count and sum) plus a <name>_seconds_max gauge"""
+        def series(name, labels, value):
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+            return f'{prefix}{name}{{{label_text}}} {value}' if labels else f'{prefix}{name} {value}'
+        lines = []
+        with self._lock:
+            counters, timers = sorted(self.counters.items()), sorted(self.timers.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {prefix}{name}_total counter')
+            lines.append(series(f'{name}_total', labels, value))
+        for family, kind in (('_seconds', 'summary'), ('_seconds_max', 'gauge')):
+            typed = set()
+            for (name, labels), (count, total, longest) in timers:
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {prefix}{name}{family} {kind}')
+                if kind == 'summary':
+                    lines.append(series(f'{name}_seconds_count', labels, count))
+                    lines.append(series(f'{name}_seconds_sum', labels, round(total, 6)))
+                else:
+                    lines.append(series(f'{name}_seconds_max', labels, round(longest, 6)))
+        return '\n'.join(lines) + '\n'
+
+# Process-wide totals served by /api/metrics
+registry = Metrics()
@@ -0,0 +1,112 @@
+"""Schema migrations for the SQLite database.
+
+The schema version lives in SQLite's PRAGMA user_version. A new database is created straight
+from the models and stamped with the latest version; an existing one gets any missing tables
+from the models and then runs the migrations above its version in order, each in its own
+transaction. To change the schema, change the models and append a migration that brings an
+existing database to the same shape.
+"""
+import json
+
+from sqlalchemy import inspect, text
+
+from models import parse_slot_ref
+
+def _add_hot_path_indexes(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_timetable_status_created_at ON timetable (status, created_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_slot_timetable_status ON slot (timetable_id, approval_status)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_slot_teacher ON slot (teacher_id, day, slot_index)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_slot_batch ON slot (batch_id, day, slot_index)'))
+
+def _load_json_list(value):
+    try:
+        items = json.loads(value) if value else []
+    except (TypeError, ValueError):
+        return []
+    return items if isinstance(items, list) else []
+
+def _normalize_json_columns(conn):
+    """Copy the JSON list columns into their association tables (created from the models)"""
+    faculty_subjects, unavailability, subject_batches, fixed_slots, electives = [], [], [], [], []
+    for faculty_id, subjects, unavailable in conn.execute(text('SELECT id, subjects, unavailable_slots FROM faculty')):
+        for position, subject in enumerate(dict.fromkeys(map(str, _load_json_list(subjects)))):
+            faculty_subjects.append({'faculty_id': faculty_id, 'subject': subject, 'position': position})
+        for position, (day, slot_index) in enumerate(
+                dict.fromkeys(filter(None, map(parse_slot_ref, _load_json_list(unavailable))))):
+            unavailability.append({'faculty_id': faculty_id, 'day': day, 'slot_index': slot_index, 'position': position})
+    for subject_id, batches, fixed in conn.execute(text('SELECT id, batches, fixed_slots FROM subject')):
+        for position, batch_id in enumerate(dict.fromkeys(map(str, _load_json_list(batches)))):
+            subject_batches.append({'subject_id': subject_id, 'batch_id': batch_id, 'position': position})
+        for position, item in enumerate(_load_json_list(fixed)):
+            ref = parse_slot_ref(item)
+            if ref:
+                room_id = item.get('room_id') if isinstance(item, dict) else None
+                fixed_slots.append({'subject_id': subject_id, 'day': ref[0], 'slot_index': ref[1],
+                                    'room_id': room_id, 'position': position})
+    for batch_id, batch_electives in conn.execute(text('SELECT id, electives FROM batch')):
+        for position, subject in enumerate(dict.fromkeys(map(str, _load_json_list(batch_electives)))):
+            electives.append({'batch_id': batch_id, 'subject': subject, 'position': position})
+
+    for sql, rows in (
+        ('INSERT OR IGNORE INTO faculty_subject (faculty_id, subject, position) VALUES (:faculty_id, :subject, :position)', faculty_subjects),
+        ('INSERT OR IGNORE INTO faculty_unavailability (faculty_id, day, slot_index, position) '
+         'VALUES (:faculty_id, :day, :slot_index, :position)', unavailability),
+        ('INSERT OR IGNORE INTO subject_batch (subject_id, batch_id, position) VALUES (:subject_id, :batch_id, :position)', subject_batches),
+        ('INSERT INTO subject_fixed_slot (subject_id, day, slot_index, room_id, position) '
+         'VALUES (:subject_id, :day, :slot_index, :room_id, :position)', fixed_slots),
+        ('INSERT OR IGNORE INTO batch_elective (batch_id, subject, position) VALUES (:batch_id, :subject, :position)', electives)):
+        if rows:
+            conn.execute(text(sql), rows)
+
+def _add_job_owner(conn):
+    if 'owner' not in {column['name'] for column in inspect(conn).get_columns('generation_job')}:
+        conn.execute(text('ALTER TABLE generation_job ADD COLUMN owner VARCHAR(32)'))
+
+def _order_unavailability(conn):
+    """Number the unavailable slots of every faculty member in the order of its JSON mirror column"""
+    if 'position' not in {column['name'] for column in inspect(conn).get_columns('faculty_unavailability')}:
+        conn.execute(text('ALTER TABLE faculty_unavailability ADD COLUMN position INTEGER NOT NULL DEFAULT 0'))
+    positions = []
+    for faculty_id, unavailable in conn.execute(text('SELECT id, unavailable_slots FROM faculty')):
+        for position, (day, slot_index) in enumerate(
+                dict.fromkeys(filter(None, map(parse_slot_ref, _load_json_list(unavailable))))):
+            positions.append({'faculty_id': faculty_id, 'day': day, 'slot_index': slot_index, 'position': position})
+    if positions:
+        conn.execute(text('UPDATE faculty_unavailability SET position = :position '
+                          'WHERE faculty_id = :faculty_id AND day = :day AND slot_index = :slot_index'), positions)
+
+# (version, description, function(connection)); versions increase by one
+MIGRATIONS = [
+    (1, 'Indexes for slot approval, teacher and batch lookups and pending timetables', _add_hot_path_indexes),
+    (2, 'Move JSON list columns into association tables', _normalize_json_columns),
+    (3, 'Lease token on generation jobs', _add_job_owner),
+    (4, 'Order faculty unavailability by position', _order_unavailability),
+]
+LATEST_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def schema_version(conn):
+    return conn.execute(text('PRAGMA user_version')).scalar()
+
+def _set_schema_version(conn, version):
+    conn.execute(text(f'PRAGMA user_version = {int(version)}'))
+
+def migrate(engine, metadata):
+    """Bring the database behind engine up to date with metadata; returns the versions applied"""
+    with engine.begin() as conn:
+        fresh = not inspect(conn).get_table_names()
+        metadata.create_all(conn)
+        if fresh:
+            _set_schema_version(conn, LATEST_VERSION)
+            return []
+        current = schema_version(conn)
+
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            upgrade(conn)
+            _set_schema_version(conn, version)
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
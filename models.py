@@ -57,6 +57,52 @@ class Batch(db.Model):
     shift = db.Column(db.String(50), default='morning')  # 'morning', 'evening'
     electives = db.Column(db.Text, nullable=True)  # JSON string of elective subjects
 
+# Association tables for the list-valued attributes above. The JSON columns (Faculty.subjects and
+# unavailable_slots, Subject.batches and fixed_slots, Batch.electives) are still written as a mirror
+# for older readers, but these tables are what the application reads. position keeps list order.
+class FacultySubject(db.Model):
+    faculty_id = db.Column(db.String(50), db.ForeignKey('faculty.id'), primary_key=True)
+    subject = db.Column(db.String(100), primary_key=True)  # subject name, as entered for the faculty member
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+class FacultyUnavailability(db.Model):
+    faculty_id = db.Column(db.String(50), db.ForeignKey('faculty.id'), primary_key=True)
+    day = db.Column(db.String(20), primary_key=True)
+    slot_index = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+class SubjectBatch(db.Model):
+    subject_id = db.Column(db.String(50), db.ForeignKey('subject.id'), primary_key=True)
+    batch_id = db.Column(db.String(50), db.ForeignKey('batch.id'), primary_key=True, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+class SubjectFixedSlot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.String(50), db.ForeignKey('subject.id'), nullable=False, index=True)
+    day = db.Column(db.String(20), nullable=False)
+    slot_index = db.Column(db.Integer, nullable=False)
+    room_id = db.Column(db.String(50), nullable=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+class BatchElective(db.Model):
+    batch_id = db.Column(db.String(50), db.ForeignKey('batch.id'), primary_key=True)
+    subject = db.Column(db.String(100), primary_key=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+def parse_slot_ref(value):
+    """(day, slot_index) of an unavailable or fixed slot given as "Mon-2", ["Mon", 2] or
+    {"day": "Mon", "slot_index": 2}; None if it is none of those"""
+    try:
+        if isinstance(value, str):
+            day, slot_index = value.rsplit('-', 1)
+        elif isinstance(value, dict):
+            day, slot_index = value['day'], value['slot_index']
+        else:
+            day, slot_index = value
+        return str(day), int(slot_index)
+    except (ValueError, TypeError, KeyError):
+        return None
+
 class Shift(db.Model):
     id = db.Column(db.String(50), primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -65,6 +111,9 @@ class Shift(db.Model):
     department = db.Column(db.String(100), nullable=True)
 
 class Timetable(db.Model):
+    __table_args__ = (
+        db.Index('ix_timetable_status_created_at', 'status', 'created_at'),  # dashboard: pending options, newest first
+    )
     id = db.Column(db.Integer, primary_key=True)
     version = db.Column(db.Integer, nullable=False, default=1)
     status = db.Column(db.String(50), default='pending_approval')  # pending_approval, approved, rejected
@@ -76,6 +125,11 @@ class Timetable(db.Model):
     slots = db.relationship('Slot', backref='timetable', lazy=True, cascade="all, delete-orphan")
 
 class Slot(db.Model):
+    __table_args__ = (
+        db.Index('ix_slot_timetable_status', 'timetable_id', 'approval_status'),  # approvals and per-option counts
+        db.Index('ix_slot_teacher', 'teacher_id', 'day', 'slot_index'),
+        db.Index('ix_slot_batch', 'batch_id', 'day', 'slot_index'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     timetable_id = db.Column(db.Integer, db.ForeignKey('timetable.id'), nullable=False)
 
@@ -92,4 +146,37 @@ class Slot(db.Model):
     approval_status = db.Column(db.String(50), default='pending')  # pending, approved, rejected, change_requested
     approved_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     change_reason = db.Column(db.Text, nullable=True)
-    approved_at = db.Column(db.DateTime, nullable=True)
\ No newline at end of file
+    approved_at = db.Column(db.DateTime, nullable=True)
+
+class GenerationJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    payload = db.Column(db.Text, nullable=False)  # JSON body of the generate request
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+
+    # Progress, updated while the job runs
+    attempts = db.Column(db.Integer, default=0)
+    valid_harmonies = db.Column(db.Integer, default=0)
+    best_dissonance = db.Column(db.Integer, nullable=True)
+
+    result = db.Column(db.Text, nullable=True)  # JSON response body once finished
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # doubles as the heartbeat of a running job
+    owner = db.Column(db.String(32), nullable=True)  # lease token of the run that claimed the job
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class TableVersion(db.Model):
+    # Change counter of a master-data table, bumped in the same transaction as every write to it;
+    # the listing endpoints use it as their ETag and cache key
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class GenerationCache(db.Model):
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of the normalized payload and algorithm version
+    problem_key = db.Column(db.String(64), nullable=False, index=True)  # sha256 of the scheduling problem alone
+    harmonies = db.Column(db.Text, nullable=False)  # JSON list of [slots, dissonance] pairs, best first
+    size = db.Column(db.Integer, nullable=False)  # len(harmonies), for size-based eviction
+    hits = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
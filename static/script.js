@@ -108,18 +108,10 @@ async function handleGeneration(event) {
     };
 
     try {
-        const response = await fetch('/api/generate', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(data)
+        const result = await runGenerationJob(data, job => {
+            const best = job.best_dissonance === null ? '-' : job.best_dissonance;
+            statusMessage.textContent = `Searching... ${job.attempts} attempts, ${job.valid_harmonies} valid timetables, best score ${best}`;
         });
-
-        if (!response.ok) {
-            const error = await response.json();
-            throw new Error(error.error || 'Failed to generate timetables.');
-        }
-
-        const result = await response.json();
         statusMessage.textContent = `Success! Generated ${result.timetables.length} optimized timetable options. Redirecting...`;
         statusMessage.style.color = '#28a745';
         setTimeout(() => {
@@ -134,6 +126,31 @@ async function handleGeneration(event) {
     }
 }
 
+// Submit a background generation job and poll it until it finishes
+async function runGenerationJob(data, onProgress) {
+    const response = await fetch('/api/jobs', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(data)
+    });
+    const job = await response.json();
+    if (!response.ok) {
+        throw new Error(job.error || 'Failed to start timetable generation.');
+    }
+
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const status = await (await fetch(job.status_url)).json();
+        if (status.status === 'completed') {
+            return status.result;
+        }
+        if (status.status === 'failed') {
+            throw new Error(status.error || 'Failed to generate timetables.');
+        }
+        onProgress(status);
+    }
+}
+
 // --- DASHBOARD PAGE LOGIC (Updated) ---
 async function loadDashboardData() {
     console.log("✅ Running the LATEST version of the script file! Version 4 (Multiple Timetables).");
@@ -142,6 +159,14 @@ async function loadDashboardData() {
         if (!response.ok) throw new Error('Could not fetch data.');
         const data = await response.json();
         updateDashboardUI(data);
+        // Slots are fetched only for the option on display, the most recent one
+        let slots = [];
+        if (data.timetables && data.timetables.length > 0) {
+            const slotsResponse = await fetch(`/api/timetables/${data.timetables[0].id}/slots`);
+            if (!slotsResponse.ok) throw new Error('Could not fetch timetable slots.');
+            slots = await slotsResponse.json();
+        }
+        renderTimetables(slots);
     } catch (error) {
         console.error('Dashboard Error:', error);
         document.getElementById('timetables-container').innerHTML = `<p style="color: red;">Error loading dashboard data.</p>`;
@@ -211,10 +236,8 @@ function updateDashboardUI(data) {
 
     // Update quick stats
     document.getElementById('last-updated').textContent = new Date().toLocaleTimeString();
-    document.getElementById('active-users').textContent = users.length;
+    document.getElementById('active-users').textContent = stats.users ?? users.length;
     document.getElementById('weekly-approvals').textContent = stats.approved_slots;
-
-    renderTimetables(data.timetable);
 }
 
 function renderTimetables(slots) {